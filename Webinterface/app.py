@@ -1,4 +1,4 @@
-from flask import Flask, render_template, redirect, request, session, url_for, jsonify
+from flask import Flask, render_template, redirect, request, session, url_for, jsonify, Response
 import sqlite3
 from functools import wraps
 import os
@@ -6,19 +6,31 @@ import datetime
 import hashlib
 import requests
 import json
+import math
 import shutil
 import uuid
 import threading
 import time
+import queue
+import heapq
+import atexit
+import multiprocessing
+import socket
+import urllib.parse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future, wait, TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
 import cv2
 import numpy as np
 import face_recognition as fr
-from PIL import Image
-import io
+from gallery_index import build_gallery_index, ANN_THRESHOLD
+from face_worker import locate_and_encode_faces, box_iou, init_worker
+from mjpeg_stream import MJPEGStreamReader, get_camera_stream_url
 
 
 app = Flask(__name__)
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# HOMESHIELD_BASE_DIR verlegt Datenbank, Gesichter und Aufnahmen (z. B. für Benchmarks in ein Temp-Verzeichnis)
+BASE_DIR = os.environ.get('HOMESHIELD_BASE_DIR') or os.path.dirname(os.path.abspath(__file__))
 DB_FILENAME = 'homeshieldAI.db'
 
 def get_base_dir():  
@@ -33,6 +45,26 @@ def get_faces_json_path():
     
     return os.path.join(os.path.dirname(get_base_dir()), 'Gesichtserkennung', 'bekannte_gesichter.json')
 
+def get_face_images(face_data):  # Alle Bilder eines Eintrags aus bekannte_gesichter.json ('Images', sonst 'Image')
+    return face_data.get('Images') or [face_data['Image']]
+
+def remove_face_images(image_files):  # Bilddateien aus Gesichtserkennung/ und static/faces/ löschen
+    gesicht_dir = os.path.dirname(get_faces_json_path())
+    for image_file in image_files:
+        for path in (os.path.join(gesicht_dir, image_file), os.path.join(get_static_faces_dir(), image_file)):
+            if os.path.exists(path):
+                os.remove(path)
+
+def encode_encoding(encoding):  # 128-d Encoding -> BLOB (float64) für known_face_images
+    return None if encoding is None else np.asarray(encoding, dtype=np.float64).tobytes()
+
+def decode_encoding(blob):
+    return np.frombuffer(blob, dtype=np.float64)
+
+def get_encoding_cache_path():  # Alter Encoding-Cache neben bekannte_gesichter.json (nur noch für die Migration)
+
+    return os.path.join(os.path.dirname(get_faces_json_path()), 'bekannte_gesichter_encodings.npz')
+
 def get_static_faces_dir(): 
   
     path = os.path.join(get_base_dir(), 'static', 'faces')
@@ -45,133 +77,945 @@ def fetch_camera_snapshot(ip_address, timeout=5, user_agent='HomeShieldAI/1.0'):
     headers = {'User-Agent': user_agent}
     return requests.get(url, timeout=timeout, headers=headers)
 
+def connect_db(db_path=None, **kwargs):  # Neue SQLite-Verbindung mit WAL und abgestimmten Pragmas
+    connection = sqlite3.connect(db_path or get_db_path(), timeout=30, cached_statements=256, **kwargs)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.execute("PRAGMA cache_size=-16000")  # 16 MB Page-Cache pro Verbindung
+    connection.execute("PRAGMA mmap_size=67108864")  # 64 MB Memory-Mapped I/O
+    connection.execute("PRAGMA temp_store=MEMORY")
+    return connection
+
+class PooledConnection(sqlite3.Connection):  # close() gibt die Verbindung an den Pool zurück statt sie zu schließen
+
+    pool = None
+
+    def close(self):
+        if self.pool is None:
+            super().close()
+        else:
+            self.pool.release(self)
+
+class ConnectionPool:  # Wiederverwendbare SQLite-Verbindungen für Routen und Services
+
+    def __init__(self, db_path, max_idle=8):
+        self.db_path = db_path
+        self._idle = queue.LifoQueue(maxsize=max_idle)
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            connection = connect_db(self.db_path, check_same_thread=False, factory=PooledConnection)
+            connection.pool = self
+            connection.row_factory = sqlite3.Row
+            return connection
+
+    def release(self, connection):
+        try:
+            if connection.in_transaction:
+                connection.rollback()
+            connection.row_factory = sqlite3.Row
+            self._idle.put_nowait(connection)
+        except (sqlite3.Error, queue.Full):
+            sqlite3.Connection.close(connection)
+
+    def close_all(self):
+        while True:
+            try:
+                sqlite3.Connection.close(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+db_pool = ConnectionPool(get_db_path())
+atexit.register(db_pool.close_all)
+
+def parse_detection_roi(value):  # ROI-Angabe (JSON-Liste oder "x0,y0,x1,y1; ...") -> Liste relativer Rechtecke oder None
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        if value.startswith('['):
+            value = json.loads(value)
+        else:
+            value = [part.split(',') for part in value.split(';') if part.strip()]
+
+    rects = []
+    for rect in value:
+        x0, y0, x1, y1 = (float(v) for v in rect)
+        if not all(math.isfinite(v) and 0.0 <= v <= 1.0 for v in (x0, y0, x1, y1)):
+            raise ValueError(f"Koordinaten müssen zwischen 0 und 1 liegen: {rect}")
+        if x1 <= x0 or y1 <= y0:
+            raise ValueError(f"Ungültiger Bereich: {rect}")
+        rects.append((x0, y0, x1, y1))
+    return rects or None
+
+DETECTION_SCALE_RANGE = (0.25, 1.0)  # Wie die Auswahl in den Einstellungen; kleiner findet kaum noch Gesichter
+
+def parse_detection_scale(value):  # Erkennungs-Skalierung -> Zahl im unterstützten Bereich
+    scale = float(value)
+    if not math.isfinite(scale) or scale <= 0:
+        raise ValueError(f"Ungültige Skalierung: {value}")
+    return min(DETECTION_SCALE_RANGE[1], max(DETECTION_SCALE_RANGE[0], scale))
+
+class MotionDetector:  # Günstige Bewegungserkennung per Differenz zum laufenden Hintergrund (verkleinertes Graustufenbild)
+
+    def __init__(self, sensitivity=0.005, width=160, learning_rate=0.1, pixel_threshold=25, margin=0.1, max_skipped=30):
+        self.sensitivity = sensitivity  # Anteil geänderter Pixel, ab dem Bewegung erkannt wird; 0 = immer erkennen
+        self.width = width
+        self.learning_rate = learning_rate
+        self.pixel_threshold = pixel_threshold
+        self.margin = margin  # Rand um den Bewegungsbereich (relativ), damit Gesichter nicht abgeschnitten werden
+        self.max_skipped = max_skipped  # Nach so vielen übersprungenen Frames trotzdem einmal erkennen
+        self.frames = 0
+        self.skipped = 0
+        self._consecutive_skipped = 0
+        self._background = None
+
+    def _to_small_gray(self, image_data):
+        if isinstance(image_data, bytes):
+            gray = cv2.imdecode(np.frombuffer(image_data, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_4)
+        elif image_data.ndim == 3:
+            gray = cv2.cvtColor(image_data, cv2.COLOR_RGB2GRAY)
+        else:
+            gray = image_data
+        if gray is None:
+            return None
+
+        height, width = gray.shape[:2]
+        if width > self.width:
+            gray = cv2.resize(gray, (self.width, max(1, height * self.width // width)), interpolation=cv2.INTER_AREA)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def check(self, image_data):  # (Bewegung?, Bereich (x0, y0, x1, y1) relativ oder None für ganzes Bild)
+        self.frames += 1
+        gray = self._to_small_gray(image_data)
+        if gray is None or self.sensitivity <= 0:
+            return True, None
+
+        if self._background is None or self._background.shape != gray.shape:
+            self._background = gray.astype(np.float32)
+            return True, None
+
+        diff = cv2.absdiff(gray, cv2.convertScaleAbs(self._background))
+        cv2.accumulateWeighted(gray, self._background, self.learning_rate)
+        _, mask = cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)
+        changed = cv2.countNonZero(mask)
+
+        if changed < self.sensitivity * mask.size:
+            self._consecutive_skipped += 1
+            if self._consecutive_skipped <= self.max_skipped:
+                self.skipped += 1
+                return False, None
+        self._consecutive_skipped = 0
+
+        if changed == 0:
+            return True, None
+        x, y, w, h = cv2.boundingRect(mask)
+        height, width = mask.shape
+        return True, (max(0.0, x / width - self.margin), max(0.0, y / height - self.margin),
+                      min(1.0, (x + w) / width + self.margin), min(1.0, (y + h) / height + self.margin))
+
+    def get_stats(self):
+        return {
+            'frames': self.frames,
+            'skipped': self.skipped,
+            'analyzed': self.frames - self.skipped,
+            'sensitivity': self.sensitivity
+        }
+
+class MetricsRegistry:  # Laufzeit-Histogramme und Zähler pro Stufe und Kamera, als JSON oder Prometheus-Text
+
+    BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    def __init__(self):
+        self._histograms = {}  # (stage, camera) -> {'buckets': [...], 'count', 'sum_ms', 'max_ms'}
+        self._counters = {}  # (name, camera) -> Wert
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+
+    def reset(self):  # Alle Werte verwerfen (z. B. nach dem Aufwärmen im Benchmark)
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._started = time.monotonic()
+
+    @staticmethod
+    def _camera_label(camera_id):
+        return 'none' if camera_id is None else str(camera_id)
+
+    def observe(self, stage, seconds, camera_id=None):  # Dauer einer Stufe in Sekunden erfassen
+        value_ms = seconds * 1000
+        key = (stage, self._camera_label(camera_id))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {'buckets': [0] * len(self.BUCKETS_MS), 'count': 0,
+                                                     'sum_ms': 0.0, 'max_ms': 0.0}
+            for i, bound in enumerate(self.BUCKETS_MS):
+                if value_ms <= bound:
+                    histogram['buckets'][i] += 1
+                    break
+            histogram['count'] += 1
+            histogram['sum_ms'] += value_ms
+            histogram['max_ms'] = max(histogram['max_ms'], value_ms)
+
+    def increment(self, name, camera_id=None, value=1):
+        key = (name, self._camera_label(camera_id))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    @staticmethod
+    def _quantile(histogram, q):  # Obere Bucket-Grenze, unter der der Anteil q der Werte liegt
+        target = q * histogram['count']
+        seen = 0
+        for bound, count in zip(MetricsRegistry.BUCKETS_MS, histogram['buckets']):
+            seen += count
+            if seen >= target:
+                return bound
+        return round(histogram['max_ms'], 1)
+
+    def to_dict(self):
+        uptime = time.monotonic() - self._started
+        with self._lock:
+            stages = {}
+            for (stage, camera), histogram in self._histograms.items():
+                stages.setdefault(stage, {})[camera] = {
+                    'count': histogram['count'],
+                    'avg_ms': round(histogram['sum_ms'] / histogram['count'], 2),
+                    'p50_ms': self._quantile(histogram, 0.5),
+                    'p95_ms': self._quantile(histogram, 0.95),
+                    'p99_ms': self._quantile(histogram, 0.99),
+                    'max_ms': round(histogram['max_ms'], 2),
+                    'per_second': round(histogram['count'] / uptime, 3) if uptime else 0.0
+                }
+            counters = {}
+            for (name, camera), value in self._counters.items():
+                counters.setdefault(name, {})[camera] = value
+        return {'uptime_seconds': round(uptime, 1), 'stages': stages, 'counters': counters}
+
+    def render_prometheus(self):  # Prometheus-Textformat (Version 0.0.4)
+        lines = [
+            '# HELP homeshield_stage_duration_seconds Laufzeit der Pipeline-Stufen',
+            '# TYPE homeshield_stage_duration_seconds histogram'
+        ]
+        with self._lock:
+            for (stage, camera), histogram in sorted(self._histograms.items()):
+                labels = f'stage="{stage}",camera="{camera}"'
+                cumulative = 0
+                for bound, count in zip(self.BUCKETS_MS, histogram['buckets']):
+                    cumulative += count
+                    lines.append(f'homeshield_stage_duration_seconds_bucket{{{labels},le="{bound / 1000:g}"}} {cumulative}')
+                lines.append(f'homeshield_stage_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram["count"]}')
+                lines.append(f'homeshield_stage_duration_seconds_sum{{{labels}}} {histogram["sum_ms"] / 1000:.6f}')
+                lines.append(f'homeshield_stage_duration_seconds_count{{{labels}}} {histogram["count"]}')
+
+            names = sorted({name for name, _ in self._counters})
+            for name in names:
+                lines.append(f'# TYPE homeshield_{name}_total counter')
+                for (counter, camera), value in sorted(self._counters.items()):
+                    if counter == name:
+                        lines.append(f'homeshield_{name}_total{{camera="{camera}"}} {value}')
+        lines.append(f'homeshield_uptime_seconds {time.monotonic() - self._started:.1f}')
+        return '\n'.join(lines) + '\n'
+
+metrics = MetricsRegistry()
+
+class EventBroker:  # Verteilt Server-Sent Events an alle verbundenen Dashboards
+
+    def __init__(self, max_queue=100):
+        self.max_queue = max_queue
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        subscriber = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event, data):
+        message = f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                pass  # Langsamer Client verpasst das Event, holt beim nächsten Status-Event auf
+
+event_broker = EventBroker()
+
+class FaceTracker:  # Verfolgt Gesichter einer Kamera über aufeinanderfolgende Frames; eine Spur = ein Besuch
+
+    def __init__(self, iou_threshold=0.3, track_timeout=30.0, reverify_interval=10.0, max_visit=300.0):
+        self.iou_threshold = iou_threshold
+        self.track_timeout = track_timeout  # Sekunden ohne Sichtung, nach denen ein Besuch endet
+        self.reverify_interval = reverify_interval  # Identität spätestens nach so vielen Sekunden neu encodieren
+        self.max_visit = max_visit  # Lange Besuche werden nach dieser Dauer abgeschlossen und neu begonnen
+        self._tracks = []
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def reusable_boxes(self, now):  # Boxen von Spuren, deren Identität noch frisch genug zur Wiederverwendung ist
+        with self._lock:
+            return [track['location'] for track in self._tracks
+                    if now - track['encoded_at'] < self.reverify_interval]
+
+    def update(self, faces, now):  # Gesichter Spuren zuordnen; gibt (neue Spuren, abgeschlossene Besuche) zurück
+        with self._lock:
+            closed = self._expire(now)
+            # Greedy-Zuordnung nach absteigender IoU
+            pairs = sorted(((box_iou(face['location'], track['location']), i, j)
+                            for i, face in enumerate(faces) for j, track in enumerate(self._tracks)), reverse=True)
+            assigned_faces, assigned_tracks = {}, set()
+            for iou, i, j in pairs:
+                if iou < self.iou_threshold:
+                    break
+                if i not in assigned_faces and j not in assigned_tracks:
+                    assigned_faces[i] = self._tracks[j]
+                    assigned_tracks.add(j)
+
+            new_tracks = []
+            for i, face in enumerate(faces):
+                track = assigned_faces.get(i)
+                if track is None:
+                    # Ohne eigenes Encoding (Spur gerade abgelaufen) im nächsten Frame sofort neu encodieren
+                    encoded_at = now if face.get('encoded', True) else float('-inf')
+                    track = {'id': self._next_id, 'first_seen': now, 'frames': 0, 'encoded_at': encoded_at,
+                             'name': face['name'], 'confidence': face['confidence'],
+                             'is_known': face['is_known'], 'candidates': face['candidates']}
+                    self._next_id += 1
+                    self._tracks.append(track)
+                    new_tracks.append(track)
+                elif face.get('encoded', True):
+                    track['encoded_at'] = now
+                    if face['confidence'] > track['confidence']:
+                        track.update(name=face['name'], confidence=face['confidence'],
+                                     is_known=face['is_known'], candidates=face['candidates'])
+                # Gesicht trägt die aufgelöste Identität der Spur (bestes Match des Besuchs), auch ohne neues Encoding
+                face.update(name=track['name'], confidence=track['confidence'],
+                            is_known=track['is_known'], candidates=track['candidates'])
+                track['location'] = face['location']
+                track['last_seen'] = now
+                track['frames'] += 1
+                face['track_id'] = track['id']
+            return new_tracks, closed
+
+    def expire(self, now):  # Abgelaufene Besuche abschließen
+        with self._lock:
+            return self._expire(now)
+
+    def close_all(self):
+        with self._lock:
+            closed, self._tracks = self._tracks, []
+            return closed
+
+    def _expire(self, now):
+        closed = [t for t in self._tracks
+                  if now - t['last_seen'] > self.track_timeout or now - t['first_seen'] > self.max_visit]
+        if closed:
+            self._tracks = [t for t in self._tracks if t not in closed]
+        return closed
+
+    def get_tracks(self):
+        with self._lock:
+            return [{'id': t['id'], 'name': t['name'], 'confidence': t['confidence'], 'is_known': t['is_known'],
+                     'first_seen': t['first_seen'], 'last_seen': t['last_seen'], 'frames': t['frames']}
+                    for t in self._tracks]
+
+class DetectionLogWriter:  # Sammelt Erkennungen aller Kameras und schreibt sie gebündelt in die Datenbank
+
+    _STOP = object()
+
+    def __init__(self, db_path, batch_size=100, flush_interval=1.0, on_flush=None):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush  # Callback(batch) nach erfolgreichem Commit, z. B. für SSE-Events
+        self._queue = queue.Queue()
+        self._thread = None  # startet erst beim ersten Eintrag, damit der Import von app.py keine Threads erzeugt
+        self._start_lock = threading.Lock()
+        atexit.register(self.close)
+
+    def write(self, rows):  # rows: [(name, confidence, is_known, detected_at, camera_id, last_seen_at, frame_count), ...]
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    thread = threading.Thread(target=self._run, name='detection-log-writer', daemon=True)
+                    thread.start()
+                    self._thread = thread
+        for row in rows:
+            self._queue.put(row)
+
+    def flush(self, timeout=5):  # Warten, bis alle bisher eingereihten Einträge geschrieben sind
+        if self._thread is None or not self._thread.is_alive():
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=5):  # Restliche Einträge schreiben und Thread beenden
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(self._STOP)
+            self._thread.join(timeout)
+
+    def _flush(self, connection, batch):
+        started = time.perf_counter()
+        try:
+            if connection is None:
+                connection = connect_db(self.db_path)
+            with connection:
+                connection.executemany("""
+                    INSERT INTO face_detections (name, confidence, is_known, detected_at, camera_id, last_seen_at, frame_count)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, batch)
+                update_detection_stats(connection, batch)
+            metrics.observe('db_write', time.perf_counter() - started)
+            metrics.increment('db_rows_written', value=len(batch))
+        except Exception as e:
+            metrics.increment('db_write_errors')
+            print(f"❌ Fehler beim Speichern von {len(batch)} Erkennung(en): {e}")
+            if connection is not None:
+                connection.close()
+            return None
+
+        if self.on_flush is not None:
+            try:
+                self.on_flush(batch)
+            except Exception as e:
+                print(f"⚠️ Fehler nach dem Speichern von Erkennungen: {e}")
+        return connection
+
+    def _run(self):
+        connection = None
+        batch = []
+        deadline = None
+        stopping = False
+
+        while not stopping:
+            timeout = None if not batch else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            flushed = None
+            if item is self._STOP:
+                stopping = True
+            elif isinstance(item, threading.Event):  # von flush(): sofort schreiben und Bescheid geben
+                flushed = item
+            elif item is not None:
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+
+            if batch and (stopping or flushed is not None or len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                connection = self._flush(connection, batch)
+                batch = []
+            if flushed is not None:
+                flushed.set()
+
+        if connection is not None:
+            connection.close()
+
 class FastFaceRecognition:
 
-    def __init__(self):  # Initialisiere Face-Recognizer
+    def __init__(self, tolerance=0.5, top_k=3, detection_workers=None, ann_threshold=ANN_THRESHOLD, refine_margin=0.1):  # Initialisiere Face-Recognizer
         self._lock = threading.RLock()
-        self.known_faces = []
-        self.detection_log = []
+        self._gallery_lock = threading.Lock()  # serialisiert nur Galerie-Änderungen, nie die Erkennung
+        self.tolerance = tolerance
+        self.top_k = top_k
+        # Liegt die Centroid-Distanz so nah an der Toleranz, wird gegen die einzelnen Bilder nachgerechnet
+        self.refine_margin = refine_margin
+        # Ab dieser Galeriegröße approximativ (IVF) statt exakt suchen; 0 = immer exakt
+        self.ann_threshold = ann_threshold
+        # Unveränderlicher Snapshot (faces, centroid-matrix, names, index); wird bei Änderungen komplett ersetzt.
+        # Ein Eintrag in faces ist eine Person mit allen Encodings ihrer Bilder.
+        empty_matrix = np.empty((0, 128), dtype=np.float32)
+        self._gallery = ((), empty_matrix, np.empty(0, dtype=object), build_gallery_index(empty_matrix))
+        # Anzahl Worker-Prozesse für HOG + Encoding; None = alle Kerne, 0 = im aufrufenden Thread
+        self.detection_workers = (os.cpu_count() or 1) if detection_workers is None else detection_workers
+        self._detection_pool = None
+        self.detection_log = deque(maxlen=100)
+        self._camera_face_status = {}
+        self._log_writer = DetectionLogWriter(get_db_path(), on_flush=self._publish_written)
+        self._trackers = {}  # camera_id -> FaceTracker (nur für das Monitoring)
+        atexit.register(self.close_tracks)  # läuft vor dem Schließen des Log-Writers
         self._faces_json_path = get_faces_json_path()
-        self._load_known_faces()
+        self._encoding_cache_path = get_encoding_cache_path()
+        # Galerie wird nach init_db() über reload_known_faces() aus der Tabelle known_faces geladen
+
+    @property
+    def known_faces(self):
+        return self._gallery[0]
     
-    def _load_known_faces(self):  # Lade bekannte Gesichter
+    def _load_known_faces(self):  # Lade bekannte Gesichter aus known_faces / known_face_images
       
-        with self._lock:
-            self.known_faces = []
-
-            if not os.path.exists(self._faces_json_path):
-                print("❌ Keine bekannten Gesichter gefunden")
-                return
+        with self._gallery_lock:
+            known_faces = []
 
             try:
-                with open(self._faces_json_path, 'r', encoding='utf-8') as f:
-                    faces_data = json.load(f)
+                self._migrate_faces_json()
 
-                faces_dir = get_static_faces_dir()
+                connection = get_db_connection()
+                cursor = connection.cursor()
+                cursor.execute("""
+                    SELECT f.id, f.name, i.image, i.encoding
+                    FROM known_faces f
+                    JOIN known_face_images i ON i.face_id = f.id
+                    ORDER BY f.id, i.id
+                """)
+                rows = cursor.fetchall()
+                connection.close()
 
-                for face_data in faces_data:
-                    name = face_data['Name']
-                    image_file = face_data['Image']
-                    image_path = os.path.join(faces_dir, image_file)
-
-                    if os.path.exists(image_path):
-                        image = fr.load_image_file(image_path)
-                        encodings = fr.face_encodings(image)
-
-                        if encodings:
-                            self.known_faces.append({
-                                'name': name,
-                                'encoding': encodings[0]
-                            })
-                            print(f"✅ Gesicht geladen: {name}")
-                        else:
-                            print(f"⚠️ Kein Gesicht gefunden in {image_file}")
-                    else:
-                        print(f"⚠️ Bild nicht gefunden: {image_path}")
-
-                print(f"✅ {len(self.known_faces)} bekannte Gesichter geladen")
+                people = {}
+                for face_id, name, image_file, encoding in rows:
+                    person = people.setdefault(face_id, (name, []))
+                    if encoding is not None:
+                        person[1].append((image_file, decode_encoding(encoding)))
+
+                for face_id, (name, samples) in people.items():
+                    if samples:
+                        known_faces.append(self._build_identity(face_id, name, samples))
+
+                print(f"✅ {len(known_faces)} bekannte Gesichter geladen")
+                if not known_faces:
+                    print("❌ Keine bekannten Gesichter gefunden")
 
             except Exception as e:
                 print(f"❌ Fehler beim Laden der Gesichter: {e}")
-    
-    def detect_faces_in_image(self, image_data, camera_id=None):  
-        
-        with self._lock:
+
+            self._set_gallery(known_faces)
+
+    def _migrate_faces_json(self):  # Einmalige Übernahme von bekannte_gesichter.json in die Datenbank
+        if not os.path.exists(self._faces_json_path):
+            return
+
+        connection = get_db_connection()
+        try:
+            if connection.execute("SELECT 1 FROM known_faces LIMIT 1").fetchone():
+                return
+
+            with open(self._faces_json_path, 'r', encoding='utf-8') as f:
+                faces_data = json.load(f)
+
+            # Vorhandenen Encoding-Cache nutzen, damit die Migration nicht alle Bilder neu encodiert
+            cache = self._read_encoding_cache()
+            with connection:
+                for face_data in faces_data:
+                    cursor = connection.execute(
+                        "INSERT OR IGNORE INTO known_faces (name) VALUES (?)", (face_data['Name'],))
+                    face_id = cursor.lastrowid if cursor.rowcount else connection.execute(
+                        "SELECT id FROM known_faces WHERE name = ? COLLATE NOCASE", (face_data['Name'],)).fetchone()[0]
+
+                    for image_file in get_face_images(face_data):
+                        entry = self._encode_known_image(image_file, cache)
+                        content_hash, encoding = (entry[0], entry[1]) if entry else (None, None)
+                        connection.execute("""
+                            INSERT OR IGNORE INTO known_face_images (face_id, image, content_hash, encoding)
+                            VALUES (?, ?, ?, ?)
+                        """, (face_id, image_file, content_hash, encode_encoding(encoding)))
+
+            os.replace(self._faces_json_path, self._faces_json_path + '.migrated')
+            print(f"📦 {len(faces_data)} Gesicht(er) aus bekannte_gesichter.json in die Datenbank übernommen")
+        finally:
+            connection.close()
+
+    def _encode_known_image(self, image_file, cache=None):  # (content_hash, encoding | None, neu_encodiert) oder None
+        image_path = os.path.join(get_static_faces_dir(), image_file)
+        if not os.path.exists(image_path):
+            print(f"⚠️ Bild nicht gefunden: {image_path}")
+            return None
+
+        with open(image_path, 'rb') as f:
+            content_hash = hashlib.sha1(f.read()).hexdigest()
+
+        cached = (cache or {}).get(image_file)
+        if cached is not None and cached[0] == content_hash:
+            return content_hash, cached[1], False
+
+        image = fr.load_image_file(image_path)
+        encodings = fr.face_encodings(image)
+        return content_hash, (encodings[0] if encodings else None), True
+
+    def _build_identity(self, face_id, name, samples):  # Person aus [(image_file, encoding), ...] mit Centroid und ohne Ausreißer
+        images = [image_file for image_file, _ in samples]
+        encodings = np.asarray([encoding for _, encoding in samples], dtype=np.float32).reshape(-1, 128)
+        centroid = encodings.mean(axis=0)
+
+        # Bilder, die nicht einmal zum eigenen Centroid passen (falsche Person, Fehlerkennung), nicht verwenden
+        if len(encodings) >= 3:
+            keep = np.linalg.norm(encodings - centroid, axis=1) <= self.tolerance
+            if keep.any() and not keep.all():
+                for image_file in np.asarray(images)[~keep]:
+                    print(f"⚠️ Ausreißer bei {name} ignoriert: {image_file}")
+                encodings = encodings[keep]
+                centroid = encodings.mean(axis=0)
+
+        return {
+            'id': face_id,
+            'name': name,
+            'image': images[0],
+            'images': images,
+            'samples': samples,  # alle Bilder inkl. Ausreißer, für spätere Neuberechnung
+            'encodings': encodings,
+            'encoding': centroid.astype(np.float32)
+        }
+
+    def create_known_face(self, name, image_file):  # Neue Person anlegen; wirft sqlite3.IntegrityError bei doppeltem Namen
+        entry = self._encode_known_image(image_file)
+        content_hash, encoding = (entry[0], entry[1]) if entry else (None, None)
+
+        with self._gallery_lock:
+            connection = get_db_connection()
             try:
-                if isinstance(image_data, bytes):
-                    pil_image = Image.open(io.BytesIO(image_data))
-                    image = np.array(pil_image)
-                else:
-                    image = image_data
+                with connection:
+                    face_id = connection.execute("INSERT INTO known_faces (name) VALUES (?)", (name,)).lastrowid
+                    connection.execute("""
+                        INSERT INTO known_face_images (face_id, image, content_hash, encoding)
+                        VALUES (?, ?, ?, ?)
+                    """, (face_id, image_file, content_hash, encode_encoding(encoding)))
+            finally:
+                connection.close()
+
+            if encoding is None:
+                print(f"⚠️ Kein Gesicht gefunden in {image_file}")
+            else:
+                self._set_gallery(list(self.known_faces) + [self._build_identity(face_id, name, [(image_file, encoding)])])
+                print(f"✅ Gesicht hinzugefügt: {name}")
+            return face_id
 
-                if len(image.shape) == 3 and image.shape[2] == 3:
-                    rgb_image = image
+    def add_face_image(self, face_id, image_file):  # Weiteres Bild zu einer vorhandenen Person; None wenn es sie nicht gibt
+        entry = self._encode_known_image(image_file)
+        content_hash, encoding = (entry[0], entry[1]) if entry else (None, None)
+
+        with self._gallery_lock:
+            connection = get_db_connection()
+            try:
+                row = connection.execute("SELECT name FROM known_faces WHERE id = ?", (face_id,)).fetchone()
+                if row is None:
+                    return None
+                with connection:
+                    connection.execute("""
+                        INSERT INTO known_face_images (face_id, image, content_hash, encoding)
+                        VALUES (?, ?, ?, ?)
+                    """, (face_id, image_file, content_hash, encode_encoding(encoding)))
+            finally:
+                connection.close()
+
+            name = row[0]
+            if encoding is None:
+                print(f"⚠️ Kein Gesicht gefunden in {image_file}")
+                return name
+
+            known_faces, samples = [], [(image_file, encoding)]
+            for kf in self.known_faces:
+                if kf['id'] == face_id:
+                    samples = kf['samples'] + samples
                 else:
-                    rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+                    known_faces.append(kf)
+            known_faces.append(self._build_identity(face_id, name, samples))
+            self._set_gallery(known_faces)
+            print(f"✅ Bild für {name} hinzugefügt ({len(samples)} Bild(er))")
+            return name
+
+    def delete_known_face(self, face_id):  # Person löschen; gibt (name, [image_files]) oder None zurück
+        with self._gallery_lock:
+            connection = get_db_connection()
+            try:
+                row = connection.execute("SELECT name FROM known_faces WHERE id = ?", (face_id,)).fetchone()
+                if row is None:
+                    return None
+                images = [r[0] for r in connection.execute(
+                    "SELECT image FROM known_face_images WHERE face_id = ?", (face_id,)).fetchall()]
+                with connection:
+                    connection.execute("DELETE FROM known_face_images WHERE face_id = ?", (face_id,))
+                    connection.execute("DELETE FROM known_faces WHERE id = ?", (face_id,))
+            finally:
+                connection.close()
 
-                face_locations = fr.face_locations(rgb_image, model="hog")
-                face_encodings = fr.face_encodings(rgb_image, face_locations)
-                
-                detected_faces = []
-                
-                for face_encoding, face_location in zip(face_encodings, face_locations):
-                    name = "Unbekannt"
-                    confidence = 0.0
-
-                    if self.known_faces:
-                        known_encodings = [kf['encoding'] for kf in self.known_faces]
-                        matches = fr.compare_faces(known_encodings, face_encoding, tolerance=0.5)
-                        face_distances = fr.face_distance(known_encodings, face_encoding)
-
-                        if True in matches:
-                            best_match_index = np.argmin(face_distances)
-                            if matches[best_match_index]:
-                                name = self.known_faces[best_match_index]['name']
-                                confidence = 1.0 - face_distances[best_match_index]
-
-                    detected_faces.append({
-                        'name': name,
-                        'confidence': float(confidence),
-                        'location': face_location,
-                        'is_known': name != "Unbekannt"
-                    })
-                
+            known_faces = [kf for kf in self.known_faces if kf['id'] != face_id]
+            if len(known_faces) != len(self.known_faces):
+                self._set_gallery(known_faces)
+            return row[0], images
+
+    def rename_known_face(self, face_id, new_name):  # Namen ändern; alter Name oder None, IntegrityError bei Duplikat
+        with self._gallery_lock:
+            connection = get_db_connection()
+            try:
+                row = connection.execute("SELECT name FROM known_faces WHERE id = ?", (face_id,)).fetchone()
+                if row is None:
+                    return None
+                with connection:
+                    connection.execute("UPDATE known_faces SET name = ? WHERE id = ?", (new_name, face_id))
+            finally:
+                connection.close()
+
+            # Encodings bleiben unverändert, Matrix und Index können weiterverwendet werden
+            known_faces = [dict(kf, name=new_name) if kf['id'] == face_id else kf for kf in self.known_faces]
+            self._set_gallery(known_faces, matrix=self._gallery[1], index=self._gallery[3])
+            return row[0]
+
+    def list_known_faces(self):  # Personen für die Gesichter-Seite: id, name, Titelbild, Anzahl Bilder
+        connection = get_db_connection()
+        cursor = connection.cursor()
+        cursor.execute("""
+            SELECT f.id, f.name, f.created_at,
+                   (SELECT image FROM known_face_images WHERE face_id = f.id ORDER BY id LIMIT 1),
+                   (SELECT COUNT(*) FROM known_face_images WHERE face_id = f.id)
+            FROM known_faces f
+            ORDER BY f.id
+        """)
+        faces = [{'id': row[0], 'name': row[1], 'created_at': row[2], 'image': row[3], 'image_count': row[4]}
+                 for row in cursor.fetchall()]
+        connection.close()
+        return faces
+
+    def _read_encoding_cache(self):  # {image_file: (content_hash, encoding | None)} aus dem alten npz-Cache (nur Migration)
+        if not os.path.exists(self._encoding_cache_path):
+            return {}
+
+        try:
+            with np.load(self._encoding_cache_path, allow_pickle=False) as data:
+                return {
+                    image_file: (content_hash, encoding if has_face else None)
+                    for image_file, content_hash, has_face, encoding in zip(
+                        data['images'], data['hashes'], data['has_face'], data['encodings'])
+                }
+        except Exception as e:
+            print(f"⚠️ Encoding-Cache unlesbar, wird ignoriert: {e}")
+            return {}
+
+    def _set_gallery(self, known_faces, matrix=None, index=None):  # Neuen Galerie-Snapshot bauen und atomar austauschen
+        known_faces = tuple(known_faces)
+        if matrix is None:
+            if known_faces:
+                matrix = np.ascontiguousarray([kf['encoding'] for kf in known_faces], dtype=np.float32)
+            else:
+                matrix = np.empty((0, 128), dtype=np.float32)
+        if index is None:
+            index = build_gallery_index(matrix, self.ann_threshold)
+        names = np.array([kf['name'] for kf in known_faces], dtype=object)
+        self._gallery = (known_faces, matrix, names, index)
+
+    def match_encodings(self, face_encodings, top_k=None):  # Alle Gesichter eines Frames in einem Schritt abgleichen
+        # Gibt pro Gesicht die top_k nächsten bekannten Gesichter als [(name, distanz), ...] zurück,
+        # aufsteigend nach Distanz sortiert.
+        known_faces, matrix, names, index = self._gallery
+        if len(face_encodings) == 0 or len(matrix) == 0:
+            return [[] for _ in face_encodings]
+
+        # 1. Schritt: Centroids pro Person, Brute Force oder IVF je nach Galeriegröße
+        queries = np.asarray(face_encodings, dtype=np.float32)
+        candidates, candidate_dist = index.search(queries, top_k or self.top_k)
+
+        results = []
+        for query, row_idx, row_dist in zip(queries, candidates, candidate_dist):
+            matches = []
+            for idx, dist in zip(row_idx, row_dist):
+                if idx < 0:
+                    continue
+                # 2. Schritt: nur knappe Fälle gegen die einzelnen Bilder der Person nachrechnen
+                samples = known_faces[idx]['encodings']
+                if len(samples) > 1 and abs(dist - self.tolerance) <= self.refine_margin:
+                    dist = np.sqrt(np.min(np.einsum('ij,ij->i', samples - query, samples - query)))
+                matches.append((names[idx], float(dist)))
+            matches.sort(key=lambda match: match[1])
+            results.append(matches)
+        return results
+    
+    def _get_detection_pool(self):  # Prozess-Pool erst bei der ersten Erkennung starten
+        with self._lock:
+            if self._detection_pool is None:
+                # spawn statt fork: kein Erbe von laufenden Threads und offenen SQLite-Verbindungen;
+                # die Worker laden nur face_worker.py
+                self._detection_pool = ProcessPoolExecutor(max_workers=self.detection_workers,
+                                                           mp_context=multiprocessing.get_context('spawn'),
+                                                           initializer=init_worker)
+                print(f"⚙️ Erkennungs-Pool mit {self.detection_workers} Prozess(en) gestartet")
+            return self._detection_pool
+
+    def _locate_and_encode(self, image_data, region=None, scale=1.0, roi=None, skip_boxes=None):
+        if self.detection_workers <= 0:
+            return locate_and_encode_faces(image_data, region, scale, roi, skip_boxes)
+
+        pool = self._get_detection_pool()
+        try:
+            return pool.submit(locate_and_encode_faces, image_data, region, scale, roi, skip_boxes).result()
+        except BrokenProcessPool:
+            print("⚠️ Erkennungs-Pool abgestürzt, wird neu gestartet")
+            with self._lock:
+                if self._detection_pool is pool:
+                    self._detection_pool = None
+            return locate_and_encode_faces(image_data, region, scale, roi, skip_boxes)
+
+    def shutdown(self):  # Worker-Prozesse beenden und ausstehende Log-Einträge schreiben
+        with self._lock:
+            if self._detection_pool is not None:
+                self._detection_pool.shutdown(wait=False, cancel_futures=True)
+                self._detection_pool = None
+        self.close_tracks()
+        self._log_writer.close()
+
+    def flush_log(self, timeout=5):  # Eingereihte Erkennungen sofort schreiben, z. B. beim Stoppen des Monitorings
+        return self._log_writer.flush(timeout)
+
+    def _get_tracker(self, camera_id):
+        tracker = self._trackers.get(camera_id)
+        if tracker is None:
+            tracker = self._trackers.setdefault(camera_id, FaceTracker())
+        return tracker
+
+    def detect_faces_in_image(self, image_data, camera_id=None, region=None, scale=1.0, roi=None, track=False):  
+        # Kein globaler Lock: Aufrufe aus Monitoring und API laufen parallel auf den Worker-Prozessen,
+        # der Abgleich nutzt den jeweils aktuellen Galerie-Snapshot.
+        # track=True: Gesichter pro Kamera verfolgen, bekannte Spuren nicht neu encodieren und
+        # statt jedes Frames nur einen Eintrag pro Besuch schreiben.
+        try:
+            tracker = self._get_tracker(camera_id) if track else None
+            now = time.monotonic()
+            skip_boxes = tracker.reusable_boxes(now) if tracker else None
+
+            face_locations, face_encodings, encoded, timings = self._locate_and_encode(image_data, region, scale, roi, skip_boxes)
+            for stage, seconds in timings.items():
+                metrics.observe(stage, seconds, camera_id)
+
+            match_started = time.perf_counter()
+            detected_faces = []
+            matches = iter(self.match_encodings(face_encodings))
+            metrics.observe('match', time.perf_counter() - match_started, camera_id)
+            
+            for face_location, is_encoded in zip(face_locations, encoded):
+                candidates = next(matches) if is_encoded else []
+                name = "Unbekannt"
+                confidence = 0.0
+
+                if candidates and candidates[0][1] <= self.tolerance:
+                    name = candidates[0][0]
+                    confidence = 1.0 - candidates[0][1]
+
+                detected_faces.append({
+                    'name': name,
+                    'confidence': float(confidence),
+                    'location': face_location,
+                    'is_known': name != "Unbekannt",
+                    'encoded': is_encoded,
+                    'candidates': [{'name': n, 'distance': d} for n, d in candidates]
+                })
+
+            if tracker:
+                _, closed_tracks = tracker.update(detected_faces, now)
+                self._log_visits(closed_tracks, camera_id)
+            else:
                 self._log_detection(detected_faces, camera_id=camera_id)
-                
-                return {'faces': detected_faces, 'total_faces': len(detected_faces)}
-                
-            except Exception as e:
-                print(f"❌ Fehler bei Gesichtserkennung: {e}")
-                return {'faces': [], 'total_faces': 0}
-    
+
+            # Erst nach dem Tracker zählen: nicht neu encodierte Gesichter haben vorher noch keine Identität
+            metrics.increment('frames_processed', camera_id)
+            metrics.increment('faces_known', camera_id, sum(1 for f in detected_faces if f['is_known']))
+            metrics.increment('faces_unknown', camera_id, sum(1 for f in detected_faces if not f['is_known']))
+            self._publish_camera_faces(detected_faces, camera_id)
+            
+            return {'faces': detected_faces, 'total_faces': len(detected_faces)}
+            
+        except Exception as e:
+            metrics.increment('detection_errors', camera_id)
+            print(f"❌ Fehler bei Gesichtserkennung: {e}")
+            return {'faces': [], 'total_faces': 0}
+    
+    def _publish_camera_faces(self, detected_faces, camera_id):  # Nur Änderungen des Kamera-Status pushen
+        known_faces = [{'name': f['name'], 'confidence': round(f['confidence'], 2)}
+                       for f in detected_faces if f['is_known']]
+        unknown_count = sum(1 for f in detected_faces if not f['is_known'])
+        if known_faces:
+            status = 'known_face'
+        elif unknown_count:
+            status = 'unknown_face'
+        else:
+            status = 'no_face'
+
+        camera_status = {
+            'camera_id': camera_id,
+            'online': True,
+            'status': status,
+            'known_faces': known_faces,
+            'unknown_faces': unknown_count
+        }
+        if self._camera_face_status.get(camera_id) != camera_status:
+            self._camera_face_status[camera_id] = camera_status
+            event_broker.publish('camera_faces', camera_status)
+
+    def get_camera_face_status(self):
+        return dict(self._camera_face_status)
+
     def _log_detection(self, detected_faces, camera_id=None):
-       
+        # Schreiben übernimmt der DetectionLogWriter im Hintergrund (ein Commit pro Batch statt pro Gesicht)
         timestamp = datetime.datetime.now()
 
+        rows = []
         for face in detected_faces:
-            detection_entry = {
+            self.detection_log.append({
                 'timestamp': timestamp.isoformat(),
                 'name': face['name'],
                 'confidence': face['confidence'],
                 'is_known': face['is_known']
-            }
+            })
+            rows.append((face['name'], face['confidence'], face['is_known'], timestamp, camera_id, timestamp, 1))
+
+        if rows:
+            self._log_writer.write(rows)
+
+    def _publish_written(self, rows):  # Callback des DetectionLogWriter: erst melden, wenn die Zeilen committet sind
+        # Das Dashboard lädt bei 'detection' die Liste aus der Datenbank neu, deshalb nicht schon vor dem Schreiben
+        by_camera = {}
+        for name, confidence, is_known, detected_at, camera_id, _, _ in rows:
+            by_camera.setdefault(camera_id, []).append(
+                {'name': name, 'confidence': confidence, 'is_known': is_known, 'detected_at': detected_at})
+        for camera_id, faces in by_camera.items():
+            self._publish_detection(faces, camera_id, max(f['detected_at'] for f in faces))
+
+    def _publish_detection(self, faces, camera_id, timestamp=None):
+        if faces:
+            event_broker.publish('detection', {
+                'camera_id': camera_id,
+                'detected_at': (timestamp or datetime.datetime.now()).isoformat(),
+                'faces': [{'name': f['name'], 'confidence': f['confidence'], 'is_known': f['is_known']} for f in faces]
+            })
 
-            self.detection_log.append(detection_entry)
+    def _log_visits(self, tracks, camera_id):  # Abgeschlossene Spuren als je einen Eintrag mit erster/letzter Sichtung schreiben
+        if not tracks:
+            return
+        # Spuren laufen auf time.monotonic(), für die Datenbank in Wanduhrzeit umrechnen
+        offset = datetime.datetime.now() - datetime.timedelta(seconds=time.monotonic())
+        rows = []
+        for track in tracks:
+            first_seen = offset + datetime.timedelta(seconds=track['first_seen'])
+            last_seen = offset + datetime.timedelta(seconds=track['last_seen'])
+            self.detection_log.append({
+                'timestamp': first_seen.isoformat(),
+                'name': track['name'],
+                'confidence': track['confidence'],
+                'is_known': track['is_known']
+            })
+            rows.append((track['name'], track['confidence'], track['is_known'], first_seen, camera_id,
+                         last_seen, track['frames']))
+        self._log_writer.write(rows)
 
-            try:
-                connection = get_db_connection()
-                cursor = connection.cursor()
-                cursor.execute("""
-                    INSERT INTO face_detections (name, confidence, is_known, detected_at, camera_id)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (face['name'], face['confidence'], face['is_known'], timestamp, camera_id))
-                connection.commit()
-                connection.close()
-            except Exception as e:
-                print(f"❌ Fehler beim Speichern der Erkennung: {e}")
+    def expire_tracks(self):  # Von der Monitoring-Schleife aufgerufen, auch wenn gerade keine Erkennung läuft
+        now = time.monotonic()
+        for camera_id, tracker in list(self._trackers.items()):
+            self._log_visits(tracker.expire(now), camera_id)
 
-        if len(self.detection_log) > 100:
-            self.detection_log = self.detection_log[-100:]
+    def close_tracks(self):  # Offene Besuche beim Beenden noch schreiben
+        for camera_id, tracker in list(self._trackers.items()):
+            self._log_visits(tracker.close_all(), camera_id)
+
+    def get_active_tracks(self):
+        return {camera_id: tracker.get_tracks() for camera_id, tracker in self._trackers.items()}
     
     def get_recent_detections(self, limit=50):  
     
@@ -199,22 +1043,391 @@ class FastFaceRecognition:
             
         except Exception as e:
             print(f"❌ Fehler beim Laden der Erkennungen: {e}")
-            return self.detection_log[-limit:] if self.detection_log else []
+            return list(self.detection_log)[-limit:]
     
     def reload_known_faces(self):  
       
         self._load_known_faces()
 
+class SnapshotCache:  # Letztes Kamerabild pro Kamera mit TTL; gleichzeitige Abrufe teilen sich eine Anfrage
+
+    def __init__(self, ttl=1.0):
+        self.ttl = ttl
+        self._frames = {}    # ip_address -> (image_data, monotonic timestamp)
+        self._inflight = {}  # ip_address -> Future des laufenden Abrufs
+        self._lock = threading.Lock()
+
+    def get(self, ip_address, timeout=5, max_age=None):  # JPEG-Bytes; wirft requests-Exceptions wie fetch_camera_snapshot
+        max_age = self.ttl if max_age is None else max_age
+
+        with self._lock:
+            cached = self._frames.get(ip_address)
+            if cached and time.monotonic() - cached[1] <= max_age:
+                return cached[0]
+
+            future = self._inflight.get(ip_address)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[ip_address] = future
+
+        if not leader:
+            try:
+                return future.result(timeout=timeout)
+            except FuturesTimeoutError:
+                raise requests.exceptions.Timeout(f"Timeout beim Warten auf Kamerabild von {ip_address}")
+
+        try:
+            response = fetch_camera_snapshot(ip_address, timeout=timeout)
+            response.raise_for_status()
+            image_data = response.content
+        except Exception as e:
+            with self._lock:
+                self._inflight.pop(ip_address, None)
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._frames[ip_address] = (image_data, time.monotonic())
+            self._inflight.pop(ip_address, None)
+        future.set_result(image_data)
+        return image_data
+
+    def put(self, ip_address, image_data):  # Bild aus anderer Quelle (z.B. Stream) übernehmen
+        with self._lock:
+            self._frames[ip_address] = (image_data, time.monotonic())
+
+class StreamManager:  # Ein MJPEGStreamReader pro Kamera; neue Frames landen im SnapshotCache und bei den Abonnenten
+
+    def __init__(self, buffer_size=30):
+        self.buffer_size = buffer_size
+        self._readers = {}
+        self._listeners = []  # callback(ip_address, image_data), z.B. das Monitoring
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback):
+        self._listeners.append(callback)
+
+    def _on_frame(self, ip_address, image_data):  # läuft im Thread des jeweiligen Readers
+        snapshot_cache.put(ip_address, image_data)
+        for callback in self._listeners:
+            try:
+                callback(ip_address, image_data)
+            except Exception as e:
+                print(f"❌ Fehler bei Stream-Frame von {ip_address}: {e}")
+
+    def sync(self, cameras):  # Reader für die übergebenen Kameras starten, alle anderen beenden
+        wanted = {camera['ip'] for camera in cameras if camera['ip']}
+        with self._lock:
+            for ip_address in list(self._readers):
+                if ip_address not in wanted:
+                    self._readers.pop(ip_address).stop()
+            for ip_address in wanted:
+                if ip_address not in self._readers:
+                    self._readers[ip_address] = MJPEGStreamReader(
+                        ip_address, buffer_size=self.buffer_size, on_frame=self._on_frame).start()
+                    print(f"📡 Stream verbunden: {ip_address}")
+
+    def stop_all(self):
+        with self._lock:
+            for reader in self._readers.values():
+                reader.stop()
+            self._readers.clear()
+
+    def get_reader(self, ip_address):
+        return self._readers.get(ip_address)
+
+    def get_status(self):
+        with self._lock:
+            readers = list(self._readers.values())
+        return [{
+            'ip': reader.ip_address,
+            'connected': reader.connected,
+            'frames': reader.frame_count,
+            'fps': reader.get_fps(),
+            'buffered': len(reader.frames),
+            'error': reader.last_error
+        } for reader in readers]
+
+def split_camera_address(ip_address):  # "host[:port]" -> (host, port)
+    parsed = urllib.parse.urlsplit(f"//{ip_address}")
+    return parsed.hostname, parsed.port or 80
+
+class CameraHealthMonitor:  # Prüft alle Kameras im Hintergrund per TCP-Connect und hält eine Statustabelle
+
+    def __init__(self, check_interval=10, probe_timeout=2, max_backoff=120, max_workers=8):
+        self.check_interval = check_interval
+        self.probe_timeout = probe_timeout
+        self.max_backoff = max_backoff
+        self.max_workers = max_workers
+        self._status = {}  # camera_id -> Status-Dict, wird nur als Ganzes ersetzt
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='camera-health', daemon=True)
+            self._thread.start()
+
+    def refresh(self):  # Sofortige Prüfung aller Kameras anstoßen (z.B. nach Änderungen in den Einstellungen)
+        with self._lock:
+            for camera_id, status in self._status.items():
+                self._status[camera_id] = dict(status, next_check=0)
+        self._wakeup.set()
+
+    def get(self, camera_id):
+        return self._status.get(camera_id)
+
+    def get_all(self):  # Kopie unter dem Lock: Probe-Thread und check_now ändern das Dict parallel
+        with self._lock:
+            return dict(self._status)
+
+    def get_online_cameras(self):
+        with self._lock:
+            statuses = list(self._status.values())
+        return [status for status in statuses if status['online']]
+
+    def report(self, camera_id, online, latency_ms=None):  # Ergebnis eines regulären Kamera-Abrufs übernehmen
+        with self._lock:
+            status = self._status.get(camera_id)
+            if status is None:
+                return
+            self._status[camera_id] = self._next_status(status, online, latency_ms)
+
+    def _next_status(self, status, online, latency_ms):
+        now = datetime.datetime.now().isoformat()
+        failures = 0 if online else status['failures'] + 1
+        # Offline-Kameras mit exponentiellem Backoff seltener prüfen
+        delay = self.check_interval if online else min(self.max_backoff, self.check_interval * 2 ** (failures - 1))
+        return dict(status,
+                    online=online,
+                    last_checked=now,
+                    last_seen=now if online else status['last_seen'],
+                    latency_ms=latency_ms if online else None,
+                    failures=failures,
+                    next_check=time.monotonic() + delay)
+
+    def _probe(self, ip_address):  # (online, latency_ms)
+        try:
+            host, port = split_camera_address(ip_address)
+            started = time.perf_counter()
+            with socket.create_connection((host, port), timeout=self.probe_timeout):
+                return True, round((time.perf_counter() - started) * 1000, 1)
+        except (OSError, ValueError):
+            return False, None
+
+    def _load_cameras(self):
+        connection = get_db_connection()
+        cursor = connection.cursor()
+        cursor.execute("SELECT id, ip_address, name FROM camera_settings ORDER BY id")
+        cameras = cursor.fetchall()
+        connection.close()
+        return cameras
+
+    def check_now(self, camera_ids=None):  # Fällige (oder die angegebenen) Kameras sofort prüfen
+        cameras = self._load_cameras()
+        now = time.monotonic()
+
+        with self._lock:
+            known_ids = {camera[0] for camera in cameras}
+            for camera_id in list(self._status):
+                if camera_id not in known_ids:
+                    del self._status[camera_id]
+
+            due = []
+            for camera_id, ip_address, name in cameras:
+                status = self._status.get(camera_id)
+                if status is None or status['ip'] != ip_address or status['name'] != name:
+                    status = {
+                        'id': camera_id, 'ip': ip_address, 'name': name,
+                        'online': False, 'last_checked': None, 'last_seen': None,
+                        'latency_ms': None, 'failures': 0, 'next_check': 0
+                    }
+                    self._status[camera_id] = status
+                if camera_ids is not None:
+                    if camera_id in camera_ids:
+                        due.append(status)
+                elif status['next_check'] <= now:
+                    due.append(status)
+
+        if not due:
+            return
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(due)), thread_name_prefix='probe') as executor:
+            results = executor.map(lambda st: self._probe(st['ip']) if st['ip'] else (False, None), due)
+            for status, (online, latency_ms) in zip(due, results):
+                with self._lock:
+                    current = self._status.get(status['id'])
+                    if current is not None:
+                        self._status[status['id']] = self._next_status(current, online, latency_ms)
+
+    def _run(self):
+        while True:
+            try:
+                self.check_now()
+            except Exception as e:
+                print(f"❌ Fehler bei der Kamera-Statusprüfung: {e}")
+            self._wakeup.wait(1)
+            self._wakeup.clear()
+
+class DetectionPipeline:  # Entkoppelt Abruf und Erkennung: begrenzte Queue pro Kamera, Worker-Threads für die Erkennung
+
+    def __init__(self, process, workers=1, queue_size=1, on_result=None):
+        self._process = process  # process(camera, image_data) -> Ergebnis
+        self._on_result = on_result  # on_result(camera, ergebnis), z.B. für den Scheduler
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self._queues = {}  # camera_id -> deque[(camera, image_data, captured_at)]; verarbeitet wird immer der neueste
+        self._ready = deque()  # Kameras mit wartenden Frames, reihum abgearbeitet
+        self._busy = set()  # Eine Kamera wird nie parallel verarbeitet (Tracker/Motion-State pro Kamera)
+        self._stats = {}
+        self._cond = threading.Condition()
+        self._threads = []  # auch Worker früherer Läufe, solange sie noch eine Erkennung beenden
+        self._running = False
+        self._generation = 0  # Worker eines früheren Laufs beenden sich, statt nach einem Neustart weiterzuarbeiten
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            self._generation += 1
+            new_threads = [threading.Thread(target=self._worker, args=(self._generation,),
+                                            name=f'detect-{self._generation}-{i}', daemon=True)
+                           for i in range(self.workers)]
+            self._threads = [thread for thread in self._threads if thread.is_alive()] + new_threads
+        for thread in new_threads:
+            thread.start()
+
+    def stop(self, timeout=2):  # Wartende Frames verwerfen, laufende Erkennungen noch beenden lassen
+        with self._cond:
+            self._running = False
+            for frames in self._queues.values():
+                frames.clear()
+            self._ready.clear()
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        with self._cond:
+            # Hängende Worker behalten, damit get_stats sie zählt; sie beenden sich nach ihrer Erkennung selbst
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+
+    def submit(self, camera, image_data, captured_at=None):  # Frame einreihen; False, wenn dafür ein älterer verworfen wurde
+        camera_id = camera['id']
+        with self._cond:
+            frames = self._queues.get(camera_id)
+            if frames is None:
+                frames = self._queues[camera_id] = deque(maxlen=self.queue_size)
+            stats = self._camera_stats(camera_id)
+            stats['submitted'] += 1
+
+            dropped = len(frames) == frames.maxlen
+            if dropped:
+                stats['dropped'] += 1  # Queue voll: der älteste wartende Frame fällt heraus
+                metrics.increment('frames_dropped', camera_id)
+            frames.append((camera, image_data, captured_at or time.monotonic()))
+            if camera_id not in self._ready and camera_id not in self._busy:
+                self._ready.append(camera_id)
+            self._cond.notify()
+            return not dropped
+
+    def _camera_stats(self, camera_id):
+        stats = self._stats.get(camera_id)
+        if stats is None:
+            stats = self._stats[camera_id] = {'submitted': 0, 'dropped': 0, 'processed': 0,
+                                              'latency_ms': None, 'avg_latency_ms': None, 'max_latency_ms': 0.0}
+        return stats
+
+    def _worker(self, generation):
+        while True:
+            with self._cond:
+                while self._running and self._generation == generation and not self._ready:
+                    self._cond.wait()
+                if not self._running or self._generation != generation:
+                    return
+                camera_id = self._ready.popleft()
+                frames = self._queues[camera_id]
+                camera, image_data, captured_at = frames.pop()  # neuester Frame gewinnt
+                if frames:  # ältere Frames sind damit überholt
+                    self._camera_stats(camera_id)['dropped'] += len(frames)
+                    metrics.increment('frames_dropped', camera_id, len(frames))
+                    frames.clear()
+                self._busy.add(camera_id)
+
+            try:
+                result = self._process(camera, image_data)
+                if self._on_result is not None:
+                    self._on_result(camera, result)
+            except Exception as e:
+                print(f"❌ Fehler in der Erkennungs-Pipeline ({camera.get('name')}): {e}")
+                result = None
+
+            latency_ms = (time.monotonic() - captured_at) * 1000
+            metrics.observe('end_to_end', latency_ms / 1000, camera_id)
+            with self._cond:
+                self._busy.discard(camera_id)
+                stats = self._camera_stats(camera_id)
+                stats['processed'] += 1
+                stats['latency_ms'] = round(latency_ms, 1)
+                # Gleitender Mittelwert, damit einzelne Ausreißer nicht dominieren
+                previous = stats['avg_latency_ms']
+                stats['avg_latency_ms'] = round(latency_ms if previous is None else 0.8 * previous + 0.2 * latency_ms, 1)
+                stats['max_latency_ms'] = round(max(stats['max_latency_ms'], latency_ms), 1)
+                if self._queues.get(camera_id) and camera_id not in self._ready:
+                    self._ready.append(camera_id)
+                    self._cond.notify()
+
+    def get_stats(self):
+        with self._cond:
+            cameras = {camera_id: dict(stats, queue_depth=len(self._queues.get(camera_id, ())))
+                       for camera_id, stats in self._stats.items()}
+            return {
+                'running': self._running,
+                'workers': self.workers,
+                'live_workers': sum(1 for thread in self._threads if thread.is_alive()),
+                'busy_workers': len(self._busy),
+                'queue_size': self.queue_size,
+                'queued_frames': sum(len(frames) for frames in self._queues.values()),
+                'cameras': cameras
+            }
+
 class FaceMonitoringService:  
-    def __init__(self, face_recognizer, monitoring_interval=10):
+    def __init__(self, face_recognizer, monitoring_interval=10, snapshot_timeout=3, max_fetch_workers=8, use_streams=True,
+                 active_interval=1.0, max_interval=300, discovery_interval=5, stream_fps=5):
         self.face_recognizer = face_recognizer
-        self.monitoring_interval = monitoring_interval
+        self.use_streams = use_streams  # Frames aus dauerhaften MJPEG-Streams statt Einzel-Snapshots
+        # Kameras mit Aktivität bekommen jeden Stream-Frame (bis stream_fps) in die Pipeline,
+        # ruhige Kameras tastet weiter der Scheduler in ihrem Takt ab
+        self.stream_fps = stream_fps
+        self._cameras_by_ip = {}
+        self._last_stream_submit = {}  # camera_id -> monotonic
+        self._motion_detectors = {}  # camera_id -> MotionDetector
+        self.monitoring_interval = monitoring_interval  # Grundtakt, sofern die Kamera keinen eigenen hat
+        self.active_interval = active_interval  # Takt nach Bewegung oder Gesichtern
+        self.max_interval = max_interval  # Obergrenze für fehlerhafte Kameras
+        self.discovery_interval = discovery_interval  # So oft wird die Liste aktiver Kameras aktualisiert
+        # Deadline-Queue: Heap aus (fällig_um, camera_id); _deadlines hält den jeweils gültigen Eintrag
+        self._schedule = []
+        self._deadlines = {}
+        self._cadence = {}  # camera_id -> aktueller Takt in Sekunden
+        self._wake_event = threading.Event()  # weckt die Schleife bei Stop oder geänderten Einstellungen
+        # Erkennung läuft entkoppelt vom Abruf; ein Thread pro Erkennungs-Prozess reicht, um den Pool auszulasten
+        self.pipeline = DetectionPipeline(self._process_snapshot, workers=max(1, face_recognizer.detection_workers),
+                                          on_result=self._on_detection_result)
+        self.snapshot_timeout = snapshot_timeout
+        self.max_fetch_workers = max_fetch_workers
         self.is_running = False
         self.monitoring_thread = None
         self.last_detection_time = None
         self.active_cameras = []
         self._lock = threading.RLock()
+        # Serialisiert Start und Stop komplett (inkl. Warten auf die Schleife), ohne den Scheduler-Lock zu halten
+        self._lifecycle_lock = threading.Lock()
         self.auto_start_enabled = False
+        self._published_status = None
+        if use_streams:
+            stream_manager.subscribe(self._on_stream_frame)
 
     def load_settings_from_db(self, user_id): 
        
@@ -277,30 +1490,54 @@ class FaceMonitoringService:
             print(f"❌ Fehler beim Speichern der Monitoring-Einstellungen: {e}")
         
     def start_monitoring(self): 
-        with self._lock:
-            if self.is_running:
-                print("⚠️ Monitoring läuft bereits")
-                return
-
-            self.is_running = True
-            self.monitoring_thread = threading.Thread(target=self._monitoring_loop, daemon=True)
-            self.monitoring_thread.start()
-            print(f"✅ Face Monitoring gestartet (Intervall: {self.monitoring_interval}s)")
+        with self._lifecycle_lock:
+            with self._lock:
+                if self.is_running:
+                    print("⚠️ Monitoring läuft bereits")
+                    return
+
+                self.is_running = True
+                self._wake_event.clear()
+                self.pipeline.start()
+                self.monitoring_thread = threading.Thread(target=self._monitoring_loop, daemon=True)
+                self.monitoring_thread.start()
+                print(f"✅ Face Monitoring gestartet (Intervall: {self.monitoring_interval}s)")
+        self.publish_status()
     
     def stop_monitoring(self):  
-        with self._lock:
-            if not self.is_running:
-                return
-
-            self.is_running = False
-            if self.monitoring_thread:
-                self.monitoring_thread.join(timeout=2)
+        # Ein start_monitoring während des Wartens würde sonst gleich wieder Streams und Pipeline verlieren
+        with self._lifecycle_lock:
+            with self._lock:
+                if not self.is_running:
+                    return
+
+                self.is_running = False
+                self._wake_event.set()
+                monitoring_thread = self.monitoring_thread
+            # Außerhalb des Scheduler-Locks warten: Schleife, Stream-Callbacks und Worker brauchen ihn zum Beenden
+            if monitoring_thread:
+                monitoring_thread.join(timeout=2)
+            stream_manager.stop_all()
             print("🛑 Face Monitoring gestoppt")
+            self.pipeline.stop()
+            # Offene Besuche schließt sonst nur die laufende Schleife ab; ohne sie gingen sie bei SIGTERM verloren
+            self.face_recognizer.close_tracks()
+            if not self.face_recognizer.flush_log():
+                print("⚠️ Erkennungen konnten beim Stoppen nicht vollständig geschrieben werden")
+        self.publish_status()
     
     def set_interval(self, seconds):  
         with self._lock:
             self.monitoring_interval = max(5, min(300, seconds))
             print(f"⚙️ Monitoring-Intervall auf {self.monitoring_interval}s gesetzt")
+            # Kameras im Grundtakt sofort auf das neue Intervall setzen
+            now = time.monotonic()
+            for camera in self.active_cameras:
+                if self._cadence.get(camera['id'], 0) > self.active_interval:
+                    self._cadence[camera['id']] = self._base_interval(camera)
+                    self._schedule_camera(camera['id'], now + self._cadence[camera['id']])
+        self._wake_event.set()
+        self.publish_status()
     
     def get_status(self):  
         return {
@@ -309,82 +1546,254 @@ class FaceMonitoringService:
             'last_detection': self.last_detection_time.isoformat() if self.last_detection_time else None,
             'active_cameras': len(self.active_cameras)
         }
+
+    def publish_status(self):  # Status nur bei Änderung an die Dashboards senden
+        status = self.get_status()
+        if status != self._published_status:
+            self._published_status = status
+            event_broker.publish('status', status)
     
-    def _get_active_cameras(self): 
-        try:
-            connection = get_db_connection()
-            cursor = connection.cursor()
-            cursor.execute("SELECT id, ip_address, name FROM camera_settings ORDER BY id")
-            cameras = cursor.fetchall()
-            connection.close()
+    def _get_active_cameras(self):  # Online-Kameras aus der Statustabelle des CameraHealthMonitor
+        settings = load_camera_detection_settings()
+        return [dict(settings.get(status['id'], {}), id=status['id'], ip=status['ip'], name=status['name'])
+                for status in camera_health.get_online_cameras()]
 
-            active_cameras = []
-            for camera in cameras:
-                try:
-                    response = requests.get(f"http://{camera[1]}/?action=snapshot", timeout=2)
-                    if response.status_code == 200:
-                        active_cameras.append({
-                            'id': camera[0],
-                            'ip': camera[1],
-                            'name': camera[2]
-                        })
-                except:
-                    pass
-
-            return active_cameras
+    def get_motion_stats(self):
+        return {camera_id: detector.get_stats() for camera_id, detector in self._motion_detectors.items()}
 
-        except Exception as e:
-            print(f"❌ Fehler beim Laden der Kameras: {e}")
-            return []
-    
-    def _monitoring_loop(self):  
-        print("🔄 Face Monitoring Loop gestartet")
+    def get_schedule(self):  # Aktueller Takt und nächste Prüfung pro Kamera
+        now = time.monotonic()
+        with self._lock:
+            return {camera_id: {'interval': round(self._cadence.get(camera_id, 0), 2),
+                                'next_check_in': round(max(0.0, deadline - now), 2)}
+                    for camera_id, deadline in self._deadlines.items()}
 
-        while self.is_running:
-            try:
-                if len(self.active_cameras) == 0 or (hasattr(self, '_camera_check_counter') and self._camera_check_counter % 5 == 0):
-                    self.active_cameras = self._get_active_cameras()
-                    print(f"📹 {len(self.active_cameras)} aktive Kameras gefunden")
+    def _base_interval(self, camera):
+        return camera.get('monitoring_interval') or self.monitoring_interval
 
-                if not hasattr(self, '_camera_check_counter'):
-                    self._camera_check_counter = 0
-                self._camera_check_counter += 1
+    def _schedule_camera(self, camera_id, deadline):  # (Neu-)Einplanen; alte Heap-Einträge werden beim Entnehmen verworfen
+        self._deadlines[camera_id] = deadline
+        heapq.heappush(self._schedule, (deadline, camera_id))
 
-                for camera in self.active_cameras:
-                    if not self.is_running:
-                        break
+    def _pop_due(self, now):  # Alle fälligen Kameras aus der Deadline-Queue nehmen
+        due = []
+        cameras = {camera['id']: camera for camera in self.active_cameras}
+        with self._lock:
+            while self._schedule and self._schedule[0][0] <= now:
+                deadline, camera_id = heapq.heappop(self._schedule)
+                if self._deadlines.get(camera_id) == deadline and camera_id in cameras:
+                    del self._deadlines[camera_id]
+                    due.append(cameras[camera_id])
+            next_deadline = self._schedule[0][0] if self._schedule else None
+        return due, next_deadline
+
+    def _adapt_cadence(self, camera, activity):  # Takt je nach Ergebnis anpassen: schneller bei Aktivität, langsamer bei Ruhe/Fehlern
+        base = self._base_interval(camera)
+        with self._lock:
+            cadence = self._cadence.get(camera['id'], base)
+            if activity in ('unknown_face', 'known_face', 'motion'):
+                cadence = min(self.active_interval if activity != 'known_face' else 2 * self.active_interval, base)
+            elif activity == 'error':
+                cadence = min(max(cadence * 2, base), self.max_interval)
+            else:
+                # Ruhig: schrittweise zurück zum Grundtakt
+                cadence = min(cadence * 1.5, base)
+            self._cadence[camera['id']] = cadence
+            return cadence
 
-                    try:
-                        response = requests.get(f"http://{camera['ip']}/?action=snapshot", timeout=3)
+    def _schedule_next(self, camera):  # Nächste Prüfung im aktuellen Takt einplanen
+        with self._lock:
+            if self.is_running:
+                self._schedule_camera(camera['id'], time.monotonic() + self._cadence.get(camera['id'], self._base_interval(camera)))
 
-                        if response.status_code == 200:
-                            result = self.face_recognizer.detect_faces_in_image(response.content)
+    def _on_detection_result(self, camera, activity):  # Callback der Pipeline: Takt anpassen, bei Aktivität vorziehen
+        cadence = self._adapt_cadence(camera, activity)
+        with self._lock:
+            deadline = self._deadlines.get(camera['id'])
+            if self.is_running and deadline is not None and time.monotonic() + cadence < deadline:
+                self._schedule_camera(camera['id'], time.monotonic() + cadence)
+                self._wake_event.set()
+
+    def _refresh_cameras(self):  # Neue Kameras sofort einplanen, entfernte/offline Kameras austragen
+        active_cameras = self._get_active_cameras()
+        if [c['id'] for c in active_cameras] != [c['id'] for c in self.active_cameras]:
+            print(f"📹 {len(active_cameras)} aktive Kameras gefunden")
+        active_ids = {camera['id'] for camera in active_cameras}
+        now = time.monotonic()
+        with self._lock:
+            self.active_cameras = active_cameras
+            self._cameras_by_ip = {camera['ip']: camera for camera in active_cameras if camera['ip']}
+            for camera in active_cameras:
+                if camera['id'] not in self._deadlines and camera['id'] not in self._cadence:
+                    self._cadence[camera['id']] = self._base_interval(camera)
+                    self._schedule_camera(camera['id'], now)
+            for camera_id in list(self._cadence):
+                if camera_id not in active_ids:
+                    self._cadence.pop(camera_id, None)
+                    self._deadlines.pop(camera_id, None)
+        self.publish_status()
+        if self.use_streams and self.is_running:
+            stream_manager.sync(active_cameras)
+    
+    def _fetch_snapshot(self, camera):  # Einzelnes Kamerabild holen (läuft im Thread-Pool)
+        started = time.perf_counter()
+        try:
+            image_data = snapshot_cache.get(camera['ip'], timeout=self.snapshot_timeout)
+        except requests.exceptions.HTTPError:
+            metrics.increment('fetch_errors', camera['id'])
+            return None
+        except requests.exceptions.RequestException:
+            metrics.increment('fetch_errors', camera['id'])
+            camera_health.report(camera['id'], False)
+            raise
+        captured_at = time.monotonic()  # pro Kamera, nicht erst wenn alle Abrufe fertig sind
+        elapsed = time.perf_counter() - started
+        metrics.observe('fetch', elapsed, camera['id'])
+        metrics.increment('frames_fetched', camera['id'])
+        camera_health.report(camera['id'], True, round(elapsed * 1000, 1))
+        return image_data, captured_at
+
+    def _fetch_snapshots(self, cameras):  # Alle Kamerabilder parallel holen
+        # Liefert [(camera, image_data, captured_at), ...] für alle Kameras, die innerhalb der Deadline
+        # geantwortet haben; langsame oder fehlerhafte Kameras werden in diesem Durchlauf übersprungen.
+        if not cameras:
+            return []
 
-                            if result['total_faces'] > 0:
-                                self.last_detection_time = datetime.datetime.now()
+        workers = max(1, min(self.max_fetch_workers, len(cameras)))
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='snapshot')
+        futures = {executor.submit(self._fetch_snapshot, camera): camera for camera in cameras}
+        try:
+            done, not_done = wait(futures, timeout=self.snapshot_timeout + 1)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
 
-                                known_faces = [f for f in result['faces'] if f['is_known']]
-                                if known_faces:
-                                    print(f"👤 {len(known_faces)} bekannte(s) Gesicht(er) erkannt auf {camera['name']}")
-                                    for face in known_faces:
-                                        print(f"   - {face['name']} (Confidence: {face['confidence']:.2f})")
+        if not_done:
+            late = [futures[f]['name'] for f in not_done]
+            print(f"⏱️ Snapshot-Timeout für {len(late)} Kamera(s): {', '.join(late)}")
 
-                                unknown_faces = [f for f in result['faces'] if not f['is_known']]
-                                if unknown_faces:
-                                    print(f"❓ {len(unknown_faces)} unbekannte(s) Gesicht(er) erkannt auf {camera['name']}")
+        snapshots = []
+        for future in done:
+            try:
+                result = future.result()
+            except Exception:
+                continue
+            if result and result[0]:
+                image_data, captured_at = result
+                snapshots.append((futures[future], image_data, captured_at))
+        return snapshots
+
+    def _process_snapshot(self, camera, image_data):  # Erkennung auf einem Kamerabild ausführen
+        # Gibt die Aktivität für den Scheduler zurück: unknown_face, known_face, motion, idle oder error
+        try:
+            detector = self._motion_detectors.get(camera['id'])
+            if detector is None:
+                detector = self._motion_detectors[camera['id']] = MotionDetector()
+            detector.sensitivity = camera.get('motion_sensitivity', detector.sensitivity)
+
+            # Statische Frames gar nicht erst an die Gesichtserkennung geben
+            motion_started = time.perf_counter()
+            has_motion, region = detector.check(image_data)
+            metrics.observe('motion', time.perf_counter() - motion_started, camera['id'])
+            if not has_motion:
+                metrics.increment('frames_skipped_motion', camera['id'])
+                return 'idle'
+
+            result = self.face_recognizer.detect_faces_in_image(
+                image_data, camera_id=camera['id'], region=region,
+                scale=camera.get('detection_scale', 1.0), roi=camera.get('detection_roi'), track=True)
+
+            if result['total_faces'] > 0:
+                self.last_detection_time = datetime.datetime.now()
+                self.publish_status()
+
+                known_faces = [f for f in result['faces'] if f['is_known']]
+                if known_faces:
+                    print(f"👤 {len(known_faces)} bekannte(s) Gesicht(er) erkannt auf {camera['name']}")
+                    for face in known_faces:
+                        print(f"   - {face['name']} (Confidence: {face['confidence']:.2f})")
+
+                unknown_faces = [f for f in result['faces'] if not f['is_known']]
+                if unknown_faces:
+                    print(f"❓ {len(unknown_faces)} unbekannte(s) Gesicht(er) erkannt auf {camera['name']}")
+                    return 'unknown_face'
+                return 'known_face'
+
+            return 'motion'
 
-                    except Exception:
-                        pass
+        except Exception as e:
+            # Nicht als 'idle' verbuchen: Fehler sichtbar machen, der Scheduler drosselt die Kamera nur
+            metrics.increment('processing_errors', camera['id'])
+            print(f"❌ Fehler bei der Verarbeitung von {camera.get('name', camera['id'])}: {e}")
+            return 'error'
+
+    def _run_due_cameras(self, cameras):  # Fällige Kameras abfragen, Frames an die Pipeline geben, neu einplanen
+        snapshots = self._fetch_snapshots(cameras)
+        fetched = {camera['id'] for camera, _, _ in snapshots}
+        for camera in cameras:
+            if camera['id'] not in fetched:
+                self._adapt_cadence(camera, 'error')
+            self._schedule_next(camera)
+
+        # Nicht auf die Erkennung warten: langsame Erkennung verwirft alte Frames statt den Abruf zu bremsen
+        for camera, image_data, captured_at in snapshots:
+            if self.is_running:
+                self.pipeline.submit(camera, image_data, captured_at)
+
+    def _on_stream_frame(self, ip_address, image_data):  # Callback des StreamManager für jeden neuen Frame
+        if not self.is_running:
+            return
+        now = time.monotonic()
+        with self._lock:
+            camera = self._cameras_by_ip.get(ip_address)
+            # Nur Kameras im aktiven Takt (nach Bewegung/Gesichtern); ruhige tastet der Scheduler ab
+            if camera is None or self._cadence.get(camera['id'], self.max_interval) > 2 * self.active_interval:
+                return
+            if now - self._last_stream_submit.get(camera['id'], 0) < 1.0 / self.stream_fps:
+                return
+            self._last_stream_submit[camera['id']] = now
+        metrics.increment('frames_streamed', camera['id'])
+        self.pipeline.submit(camera, image_data, now)
+
+    def get_pipeline_stats(self):
+        return self.pipeline.get_stats()
+
+    def _monitoring_loop(self):  
+        print("🔄 Face Monitoring Loop gestartet")
+
+        with self._lock:
+            self._schedule, self._deadlines, self._cadence = [], {}, {}
+        next_discovery = 0.0
 
-                time.sleep(self.monitoring_interval)
+        # Ein schnelles Stop/Start kann eine neue Schleife starten, bevor diese hier fertig ist; dann abtreten
+        current_thread = threading.current_thread()
+        while self.is_running and self.monitoring_thread is current_thread:
+            try:
+                now = time.monotonic()
+                if now >= next_discovery:
+                    self._refresh_cameras()
+                    self.face_recognizer.expire_tracks()
+                    next_discovery = now + self.discovery_interval
+
+                due, next_deadline = self._pop_due(now)
+                if due:
+                    self._run_due_cameras(due)
+                    continue
+
+                # Bis zur nächsten Deadline schlafen; Stop oder neue Einstellungen wecken sofort
+                wake_at = min(next_discovery, next_deadline) if next_deadline is not None else next_discovery
+                self._wake_event.wait(max(0.0, wake_at - time.monotonic()))
+                self._wake_event.clear()
 
             except Exception as e:
                 print(f"❌ Fehler im Monitoring Loop: {e}")
-                time.sleep(5)
+                self._wake_event.wait(5)
 
         print("🔚 Face Monitoring Loop beendet")
 
 face_recognition = FastFaceRecognition()
+camera_health = CameraHealthMonitor()
+snapshot_cache = SnapshotCache()
+stream_manager = StreamManager()
 face_monitoring = FaceMonitoringService(face_recognition, monitoring_interval=15)
 
 def generate_daily_secret_key():  
@@ -394,11 +1803,228 @@ def generate_daily_secret_key():
 
 app.secret_key = generate_daily_secret_key()
 
-def get_db_connection():  
-    db_path = get_db_path()
-    connection = sqlite3.connect(db_path)
-    connection.row_factory = sqlite3.Row
-    return connection
+def get_db_connection():  # Verbindung aus dem Pool; connection.close() gibt sie zurück
+    return db_pool.acquire()
+
+def init_db():  # Fehlende Indizes/Tabellen anlegen (idempotent)
+    try:
+        connection = get_db_connection()
+        cursor = connection.cursor()
+        # Indizes für die Keyset-Pagination auf /logs: jeder liefert die Zeilen bereits in (detected_at, id)-Reihenfolge
+        # (die Indizes ohne id enthalten implizit die rowid = id)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_fd_detected_at_id ON face_detections (detected_at DESC, id DESC)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_fd_known_detected_at ON face_detections (is_known, detected_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_fd_camera_detected_at ON face_detections (camera_id, detected_at)")
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_fd_name_detected_at_id
+            ON face_detections (name COLLATE NOCASE, detected_at DESC, id DESC)
+        """)
+        # Durch die Indizes oben ersetzt (ältere Installationen bzw. mitgelieferte Datenbank)
+        cursor.execute("DROP INDEX IF EXISTS idx_fd_name_nocase")
+        cursor.execute("DROP INDEX IF EXISTS idx_detected_at")
+
+        # Galerie bekannter Gesichter (ersetzt bekannte_gesichter.json, Migration in FastFaceRecognition)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS known_faces (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_known_faces_name ON known_faces (name COLLATE NOCASE)")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS known_face_images (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                face_id INTEGER NOT NULL,
+                image TEXT NOT NULL UNIQUE,
+                content_hash TEXT,
+                encoding BLOB,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (face_id) REFERENCES known_faces (id)
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_known_face_images_face ON known_face_images (face_id)")
+
+        # Per-Kamera-Einstellungen der Erkennungspipeline
+        cursor.execute("PRAGMA table_info(camera_settings)")
+        camera_columns = {row[1] for row in cursor.fetchall()}
+        if 'motion_sensitivity' not in camera_columns:
+            cursor.execute("ALTER TABLE camera_settings ADD COLUMN motion_sensitivity REAL DEFAULT 0.005")
+        if 'monitoring_interval' not in camera_columns:
+            cursor.execute("ALTER TABLE camera_settings ADD COLUMN monitoring_interval INTEGER")
+        if 'detection_scale' not in camera_columns:
+            cursor.execute("ALTER TABLE camera_settings ADD COLUMN detection_scale REAL DEFAULT 1.0")
+        if 'detection_roi' not in camera_columns:
+            cursor.execute("ALTER TABLE camera_settings ADD COLUMN detection_roi TEXT")
+
+        # Ein Eintrag pro Besuch: erste Sichtung in detected_at, letzte in last_seen_at
+        cursor.execute("PRAGMA table_info(face_detections)")
+        detection_columns = {row[1] for row in cursor.fetchall()}
+        if 'last_seen_at' not in detection_columns:
+            cursor.execute("ALTER TABLE face_detections ADD COLUMN last_seen_at TIMESTAMP")
+        if 'frame_count' not in detection_columns:
+            cursor.execute("ALTER TABLE face_detections ADD COLUMN frame_count INTEGER DEFAULT 1")
+
+        # Stündliche Rollups pro Kamera (camera_id 0 = ohne Kamera) und Namen pro Tag für /statistics
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS face_detection_stats (
+                bucket TEXT NOT NULL,
+                camera_id INTEGER NOT NULL DEFAULT 0,
+                total INTEGER NOT NULL DEFAULT 0,
+                known INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (bucket, camera_id)
+            ) WITHOUT ROWID
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS face_detection_stats_names (
+                day TEXT NOT NULL,
+                camera_id INTEGER NOT NULL DEFAULT 0,
+                name TEXT NOT NULL,
+                total INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, camera_id, name)
+            ) WITHOUT ROWID
+        """)
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM face_detection_stats)")
+        if not cursor.fetchone()[0]:
+            rebuild_detection_stats(cursor)
+        connection.commit()
+        connection.close()
+    except Exception as e:
+        print(f"❌ Fehler beim Initialisieren der Datenbank: {e}")
+
+def load_camera_detection_settings():  # {camera_id: {...}} mit den Erkennungs-Einstellungen pro Kamera
+    connection = get_db_connection()
+    cursor = connection.cursor()
+    cursor.execute("SELECT id, motion_sensitivity, detection_scale, detection_roi, monitoring_interval FROM camera_settings")
+    settings = {}
+    for camera_id, motion_sensitivity, detection_scale, detection_roi, monitoring_interval in cursor.fetchall():
+        try:
+            roi = parse_detection_roi(detection_roi)
+        except (ValueError, TypeError):
+            roi = None
+        settings[camera_id] = {
+            'motion_sensitivity': 0.005 if motion_sensitivity is None else motion_sensitivity,
+            'detection_scale': detection_scale or 1.0,
+            'detection_roi': roi,
+            'monitoring_interval': monitoring_interval or None  # None = globales Intervall
+        }
+    connection.close()
+    return settings
+
+def update_detection_stats(connection, rows):  # Rollup-Tabellen für neu geschriebene Erkennungen hochzählen
+    hourly = {}
+    names = {}
+    for name, confidence, is_known, detected_at, camera_id, *_ in rows:
+        if not isinstance(detected_at, datetime.datetime):
+            detected_at = datetime.datetime.fromisoformat(str(detected_at))
+        camera_key = camera_id or 0
+
+        key = (detected_at.strftime('%Y-%m-%d %H:00:00'), camera_key)
+        total, known = hourly.get(key, (0, 0))
+        hourly[key] = (total + 1, known + (1 if is_known else 0))
+
+        name_key = (detected_at.strftime('%Y-%m-%d'), camera_key, name)
+        names[name_key] = names.get(name_key, 0) + 1
+
+    connection.executemany("""
+        INSERT INTO face_detection_stats (bucket, camera_id, total, known)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (bucket, camera_id) DO UPDATE SET
+            total = total + excluded.total,
+            known = known + excluded.known
+    """, [(bucket, camera, total, known) for (bucket, camera), (total, known) in hourly.items()])
+    connection.executemany("""
+        INSERT INTO face_detection_stats_names (day, camera_id, name, total)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (day, camera_id, name) DO UPDATE SET total = total + excluded.total
+    """, [(day, camera, name, total) for (day, camera, name), total in names.items()])
+
+def rebuild_detection_stats(cursor, day_from=None, day_to=None):  # Rollups für [day_from, day_to] (oder alles) neu berechnen
+    conditions = []
+    params = []
+    if day_from:
+        conditions.append("detected_at >= ?")
+        params.append(day_from)
+    if day_to:
+        conditions.append("detected_at < ?")
+        params.append((datetime.date.fromisoformat(day_to) + datetime.timedelta(days=1)).isoformat())
+    where_clause = " WHERE " + " AND ".join(conditions) if conditions else ""
+
+    cursor.execute(f"DELETE FROM face_detection_stats{where_clause.replace('detected_at', 'bucket')}", params)
+    cursor.execute(f"DELETE FROM face_detection_stats_names{where_clause.replace('detected_at', 'day')}", params)
+    cursor.execute(f"""
+        INSERT INTO face_detection_stats (bucket, camera_id, total, known)
+        SELECT strftime('%Y-%m-%d %H:00:00', detected_at), COALESCE(camera_id, 0),
+               COUNT(*), SUM(CASE WHEN is_known = 1 THEN 1 ELSE 0 END)
+        FROM face_detections{where_clause}
+        GROUP BY 1, 2
+    """, params)
+    cursor.execute(f"""
+        INSERT INTO face_detection_stats_names (day, camera_id, name, total)
+        SELECT date(detected_at), COALESCE(camera_id, 0), name, COUNT(*)
+        FROM face_detections{where_clause}
+        GROUP BY 1, 2, 3
+    """, params)
+
+def get_detection_day_range(cursor, where_clause, params):  # (erster Tag, letzter Tag) der betroffenen Erkennungen
+    cursor.execute(f"SELECT date(MIN(detected_at)), date(MAX(detected_at)) FROM face_detections{where_clause}", params)
+    return cursor.fetchone()
+
+# Startet ein Prozess per spawn (z.B. der Erkennungs-Pool bei "python app.py"), wird dieses Skript dort
+# erneut als __mp_main__ ausgeführt; Datenbank, Galerie und Hintergrund-Threads gehören nur in den Hauptprozess.
+if __name__ != '__mp_main__':
+    init_db()
+    face_recognition.reload_known_faces()
+    camera_health.start()
+
+_detection_count_cache = {}
+_detection_count_lock = threading.Lock()
+DETECTION_COUNT_TTL = 60
+
+def get_detection_count(cursor, where_clause, params):  # COUNT(*) pro Filter für DETECTION_COUNT_TTL Sekunden cachen
+    key = (where_clause, tuple(params))
+    now = time.monotonic()
+    with _detection_count_lock:
+        cached = _detection_count_cache.get(key)
+        if cached and now - cached[1] < DETECTION_COUNT_TTL:
+            return cached[0]
+
+    cursor.execute(f"SELECT COUNT(*) FROM face_detections fd{where_clause}", params)
+    count = cursor.fetchone()[0]
+    with _detection_count_lock:
+        if len(_detection_count_cache) > 256:
+            _detection_count_cache.clear()
+        _detection_count_cache[key] = (count, now)
+    return count
+
+def invalidate_detection_count():
+    with _detection_count_lock:
+        _detection_count_cache.clear()
+
+NAME_FILTER_MAX_NAMES = 500  # Mehr passende Namen: IN-Liste wäre zu lang, dann direkt per LIKE filtern
+
+def get_name_filter_condition(cursor, name_filter):  # Teilstring-Suche auf Namen als (SQL-Bedingung, Parameter)
+    # LIKE '%x%' kann keinen Index nutzen und müsste die Treffer in einem Temp-B-Tree sortieren.
+    # Die passenden Namen kommen deshalb aus dem kleinen Rollup face_detection_stats_names:
+    # ein Name -> Gleichheit über idx_fd_name_detected_at_id (bereits sortiert, kein Temp-B-Tree),
+    # mehrere -> sortierter Scan über idx_fd_detected_at_id, der nach LIMIT Treffern abbricht.
+    escaped = name_filter.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    pattern = f"%{escaped}%"
+    cursor.execute("SELECT DISTINCT name FROM face_detection_stats_names WHERE name LIKE ? ESCAPE '\\'", (pattern,))
+    names = sorted({row[0] for row in cursor.fetchall()}, key=str.lower)
+    if names and len({name.lower() for name in names}) == 1:
+        return "fd.name = ? COLLATE NOCASE", [names[0]]
+    if names and len(names) <= NAME_FILTER_MAX_NAMES:
+        # Unäres + schließt den Namensindex aus, damit der Planer in Sortierreihenfolge scannt
+        return f"+fd.name IN ({', '.join('?' * len(names))})", names
+    return "fd.name LIKE ? ESCAPE '\\'", [pattern]
+
+def parse_log_cursor(value):  # "<detected_at>|<id>" -> (detected_at, id) oder None
+    try:
+        detected_at, detection_id = value.rsplit('|', 1)
+        return detected_at, int(detection_id)
+    except (AttributeError, ValueError):
+        return None
 
 def get_time_ago(timestamp_str):  
     try:
@@ -511,7 +2137,7 @@ def dashboard():
     
     camera_list = []
     for camera in cameras:
-        stream_url = f"http://{camera[2]}/?action=stream" if camera[2] else "/static/pictures/static.png"
+        stream_url = get_camera_stream_url(camera[2]) if camera[2] else "/static/pictures/static.png"
         
         camera_dict = {
             'id': camera[0],
@@ -595,35 +2221,24 @@ def faces():
     
    
     faces = []
-    faces_json_path = get_faces_json_path()
 
     try:
-        if os.path.exists(faces_json_path):
-            with open(faces_json_path, 'r', encoding='utf-8') as f:
-                known_faces_data = json.load(f)
-
-          
-            static_faces_dir = get_static_faces_dir()
-            
-            gesicht_dir = os.path.dirname(faces_json_path)
+        static_faces_dir = get_static_faces_dir()
+        gesicht_dir = os.path.dirname(get_faces_json_path())
 
-            
-            for i, face_data in enumerate(known_faces_data):
-                src_path = os.path.join(gesicht_dir, face_data['Image'])
-                dst_path = os.path.join(static_faces_dir, face_data['Image'])
+        for face in face_recognition.list_known_faces():
+            if face['image']:
+                src_path = os.path.join(gesicht_dir, face['image'])
+                dst_path = os.path.join(static_faces_dir, face['image'])
 
                
                 if os.path.exists(src_path) and not os.path.exists(dst_path):
                     shutil.copy2(src_path, dst_path)
 
-              
-                face = {
-                    'id': i + 1,
-                    'name': face_data['Name'],
-                    'image': face_data['Image'],
-                    'added_date': datetime.datetime.now().strftime('%d.%m.%Y')
-                }
-                faces.append(face)
+            created_at = face['created_at']
+            face['added_date'] = (datetime.datetime.fromisoformat(created_at).strftime('%d.%m.%Y')
+                                  if created_at else datetime.datetime.now().strftime('%d.%m.%Y'))
+            faces.append(face)
 
     except Exception as e:
         print(f"Fehler beim Laden der Gesichter: {e}")
@@ -655,7 +2270,7 @@ def settings():
     
     connection = get_db_connection()
     cursor = connection.cursor()
-    cursor.execute("SELECT id, name, ip_address, resolution FROM camera_settings ORDER BY id")
+    cursor.execute("SELECT id, name, ip_address, resolution, motion_sensitivity, detection_scale, detection_roi, monitoring_interval FROM camera_settings ORDER BY id")
     cameras_data = cursor.fetchall()
     connection.close()
     
@@ -665,7 +2280,11 @@ def settings():
             'id': camera[0],
             'name': camera[1],
             'ip_address': camera[2] or '',
-            'resolution': camera[3] or '1920x1080'
+            'resolution': camera[3] or '1920x1080',
+            'motion_sensitivity': 0.005 if camera[4] is None else camera[4],
+            'detection_scale': camera[5] or 1.0,
+            'detection_roi': camera[6] or '',
+            'monitoring_interval': camera[7] or 0
         }
         cameras.append(camera_dict)
     
@@ -677,7 +2296,7 @@ def get_cameras():
     """API Endpoint um alle Kameras zu laden"""
     connection = get_db_connection()
     cursor = connection.cursor()
-    cursor.execute("SELECT id, name, ip_address, resolution FROM camera_settings ORDER BY id")
+    cursor.execute("SELECT id, name, ip_address, resolution, motion_sensitivity, detection_scale, detection_roi, monitoring_interval FROM camera_settings ORDER BY id")
     cameras_data = cursor.fetchall()
     connection.close()
     
@@ -687,7 +2306,11 @@ def get_cameras():
             'id': camera[0],
             'name': camera[1],
             'ip_address': camera[2] or '',
-            'resolution': camera[3] or '1920x1080'
+            'resolution': camera[3] or '1920x1080',
+            'motion_sensitivity': 0.005 if camera[4] is None else camera[4],
+            'detection_scale': camera[5] or 1.0,
+            'detection_roi': camera[6] or '',
+            'monitoring_interval': camera[7] or 0
         }
         cameras.append(camera_dict)
     
@@ -697,6 +2320,39 @@ def get_cameras():
 @login_required
 def update_camera(camera_id): 
     data = request.get_json()
+
+    detection_roi = None
+    if 'detection_roi' in data:
+        try:
+            roi = parse_detection_roi(data.get('detection_roi'))
+        except (ValueError, TypeError) as e:
+            return jsonify({'success': False, 'message': f'Ungültiger Erkennungsbereich: {e}'}), 400
+        detection_roi = json.dumps(roi) if roi else ''
+
+    motion_sensitivity = data.get('motion_sensitivity')
+    if motion_sensitivity is not None:
+        try:
+            motion_sensitivity = float(motion_sensitivity)
+            if not (math.isfinite(motion_sensitivity) and 0 <= motion_sensitivity <= 1):
+                raise ValueError(motion_sensitivity)
+        except (ValueError, TypeError):
+            return jsonify({'success': False, 'message': 'Bewegungsempfindlichkeit muss zwischen 0 und 1 liegen'}), 400
+
+    monitoring_interval = data.get('monitoring_interval')
+    if monitoring_interval is not None:
+        try:
+            monitoring_interval = int(monitoring_interval)
+            if not (monitoring_interval == 0 or 1 <= monitoring_interval <= 300):
+                raise ValueError(monitoring_interval)
+        except (ValueError, TypeError, OverflowError):
+            return jsonify({'success': False, 'message': 'Intervall muss 0 (global) oder zwischen 1 und 300 Sekunden liegen'}), 400
+
+    detection_scale = data.get('detection_scale')
+    if detection_scale is not None:
+        try:
+            detection_scale = parse_detection_scale(detection_scale)
+        except (ValueError, TypeError):
+            return jsonify({'success': False, 'message': 'Erkennungs-Skalierung muss eine Zahl zwischen 0 und 1 sein'}), 400
     
     connection = get_db_connection()
     cursor = connection.cursor()
@@ -704,13 +2360,21 @@ def update_camera(camera_id):
     
     cursor.execute("""
         UPDATE camera_settings 
-        SET name = ?, ip_address = ?, resolution = ?
+        SET name = ?, ip_address = ?, resolution = ?,
+            motion_sensitivity = COALESCE(?, motion_sensitivity),
+            detection_scale = COALESCE(?, detection_scale),
+            detection_roi = COALESCE(?, detection_roi),
+            monitoring_interval = COALESCE(?, monitoring_interval)
         WHERE id = ?
-    """, (data.get('name'), data.get('ip_address'), data.get('resolution'), camera_id))
+    """, (data.get('name'), data.get('ip_address'), data.get('resolution'),
+          motion_sensitivity, detection_scale, detection_roi,
+          monitoring_interval, camera_id))
     
     connection.commit()
     connection.close()
     
+    camera_health.refresh()
+    
     return jsonify({'success': True, 'message': 'Kamera erfolgreich aktualisiert'})
 
 @app.route('/api/cameras/<int:camera_id>', methods=['DELETE'])
@@ -726,6 +2390,8 @@ def delete_camera(camera_id):
     connection.commit()
     connection.close()
     
+    camera_health.refresh()
+    
     return jsonify({'success': True, 'message': 'Kamera erfolgreich gelöscht'})
 
 @app.route('/api/cameras', methods=['POST'])
@@ -746,35 +2412,31 @@ def create_camera():
     connection.commit()
     connection.close()
     
+    camera_health.refresh()
+    
     return jsonify({'success': True, 'message': 'Kamera erfolgreich erstellt', 'id': new_id})
 
 @app.route('/api/cameras/<int:camera_id>/status')
 @login_required
 def check_camera_status(camera_id):  
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        cursor.execute("SELECT name, ip_address FROM camera_settings WHERE id = ?", (camera_id,))
-        camera = cursor.fetchone()
-        connection.close()
+        status = camera_health.get(camera_id)
+        if status is None:
+            # Neu angelegte Kamera: einmalig sofort prüfen
+            camera_health.check_now(camera_ids={camera_id})
+            status = camera_health.get(camera_id)
         
-        if not camera:
+        if not status:
             return jsonify({'success': False, 'error': 'Kamera nicht gefunden'})
         
-        camera_name, ip_address = camera
-        
-        if not ip_address:
+        if not status['ip']:
             return jsonify({'success': False, 'error': 'Kamera-IP nicht konfiguriert'})
         
-   
-        try:
-            response = requests.get(f"http://{ip_address}/?action=snapshot", 
-                                   timeout=3,
-                                   headers={'User-Agent': 'HomeShieldAI/1.0'})
-            response.raise_for_status()
-            return jsonify({'success': True, 'status': 'online', 'message': 'Kamera ist erreichbar'})
-        except requests.exceptions.RequestException as e:
-            return jsonify({'success': False, 'status': 'offline', 'error': f'Kamera nicht erreichbar: {str(e)}'})
+        if status['online']:
+            return jsonify({'success': True, 'status': 'online', 'message': 'Kamera ist erreichbar',
+                            'last_seen': status['last_seen'], 'latency_ms': status['latency_ms']})
+        return jsonify({'success': False, 'status': 'offline', 'error': 'Kamera nicht erreichbar',
+                        'last_seen': status['last_seen']})
             
     except Exception as e:
         return jsonify({'success': False, 'error': f'Unerwarteter Fehler: {str(e)}'})
@@ -782,14 +2444,17 @@ def check_camera_status(camera_id):
 @app.route('/logs')
 @login_required
 def logs():  
-    """Log-Seite für Gesichtserkennungen"""
+    """Log-Seite für Gesichtserkennungen (Keyset-Pagination über detected_at, id)"""
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
+        page = max(1, request.args.get('page', 1, type=int))
+        per_page = max(1, min(200, request.args.get('per_page', 20, type=int)))
+        before = parse_log_cursor(request.args.get('before'))
+        after = parse_log_cursor(request.args.get('after'))
         
        
         name_filter = request.args.get('name', '').strip()
         known_filter = request.args.get('known', '')
+        camera_filter = request.args.get('camera', '', type=str)
         date_from = request.args.get('date_from', '')
         date_to = request.args.get('date_to', '')
         
@@ -801,33 +2466,52 @@ def logs():
         params = []
         
         if name_filter:
-            where_conditions.append("name LIKE ?")
-            params.append(f"%{name_filter}%")
+            condition, name_params = get_name_filter_condition(cursor, name_filter)
+            where_conditions.append(condition)
+            params.extend(name_params)
         
         if known_filter:
             if known_filter == 'known':
-                where_conditions.append("is_known = 1")
+                where_conditions.append("fd.is_known = 1")
             elif known_filter == 'unknown':
-                where_conditions.append("is_known = 0")
+                where_conditions.append("fd.is_known = 0")
+
+        if camera_filter.isdigit():
+            where_conditions.append("fd.camera_id = ?")
+            params.append(int(camera_filter))
         
-        if date_from:
-            where_conditions.append("date(detected_at) >= ?")
-            params.append(date_from)
-            
-        if date_to:
-            where_conditions.append("date(detected_at) <= ?")
-            params.append(date_to)
+        # Bereichsvergleiche statt date(detected_at), damit die Indizes greifen
+        try:
+            if date_from:
+                datetime.date.fromisoformat(date_from)
+                where_conditions.append("fd.detected_at >= ?")
+                params.append(date_from)
+                
+            if date_to:
+                next_day = datetime.date.fromisoformat(date_to) + datetime.timedelta(days=1)
+                where_conditions.append("fd.detected_at < ?")
+                params.append(next_day.isoformat())
+        except ValueError:
+            return render_template('logs.html', detections=[], error='Ungültiges Datum')
         
         where_clause = " WHERE " + " AND ".join(where_conditions) if where_conditions else ""
         
      
-        count_query = f"SELECT COUNT(*) FROM face_detections{where_clause}"
-        cursor.execute(count_query, params)
-        total_count = cursor.fetchone()[0]
+        total_count = get_detection_count(cursor, where_clause, params)
         
-       
-        offset = (page - 1) * per_page
         
+        page_conditions = list(where_conditions)
+        page_params = list(params)
+        if after:
+            page_conditions.append("(fd.detected_at, fd.id) > (?, ?)")
+            page_params.extend(after)
+            order = "ASC"
+        else:
+            if before:
+                page_conditions.append("(fd.detected_at, fd.id) < (?, ?)")
+                page_params.extend(before)
+            order = "DESC"
+        page_where = " WHERE " + " AND ".join(page_conditions) if page_conditions else ""
         
         query = f"""
             SELECT 
@@ -837,15 +2521,21 @@ def logs():
                 fd.is_known, 
                 fd.detected_at, 
                 fd.camera_id,
-                cs.name as camera_name
+                cs.name as camera_name,
+                fd.last_seen_at,
+                fd.frame_count
             FROM face_detections fd
             LEFT JOIN camera_settings cs ON fd.camera_id = cs.id
-            {where_clause.replace('WHERE', 'WHERE') if where_clause else ''}
-            ORDER BY fd.detected_at DESC
-            LIMIT ? OFFSET ?
+            {page_where}
+            ORDER BY fd.detected_at {order}, fd.id {order}
+            LIMIT ?
         """
-        cursor.execute(query, params + [per_page, offset])
+        cursor.execute(query, page_params + [per_page + 1])
         detections = cursor.fetchall()
+        has_more = len(detections) > per_page
+        detections = detections[:per_page]
+        if after:
+            detections.reverse()
         
        
         formatted_detections = []
@@ -858,15 +2548,41 @@ def logs():
                 'detected_at': detection[4],
                 'camera_id': detection[5],
                 'camera_name': detection[6] if detection[6] else 'Unbekannte Kamera',
-                'time_ago': get_time_ago(detection[4])
+                'time_ago': get_time_ago(detection[4]),
+                'last_seen_at': detection[7],
+                'frame_count': detection[8] or 1
             })
+
+        cursor.execute("SELECT id, name FROM camera_settings ORDER BY id")
+        cameras = [{'id': row[0], 'name': row[1]} for row in cursor.fetchall()]
         
         connection.close()
         
        
-        total_pages = (total_count + per_page - 1) // per_page
-        has_prev = page > 1
-        has_next = page < total_pages
+        if after:
+            has_prev, has_next = has_more, True
+        else:
+            has_prev, has_next = before is not None, has_more
+        if page == 1:
+            has_prev = False
+        total_pages = max(1, (total_count + per_page - 1) // per_page)
+
+        filter_args = {k: v for k, v in {
+            'name': name_filter, 'known': known_filter, 'camera': camera_filter,
+            'date_from': date_from, 'date_to': date_to,
+            'per_page': per_page if per_page != 20 else None
+        }.items() if v}
+        first_url = url_for('logs', **filter_args)
+        if after and not has_more:
+            # Zurückblättern hat die neuesten Einträge erreicht: reguläre erste Seite anzeigen
+            return redirect(first_url)
+        prev_url = next_url = None
+        if formatted_detections:
+            first, last = formatted_detections[0], formatted_detections[-1]
+            if has_prev:
+                prev_url = url_for('logs', page=page - 1, after=f"{first['detected_at']}|{first['id']}", **filter_args)
+            if has_next:
+                next_url = url_for('logs', page=page + 1, before=f"{last['detected_at']}|{last['id']}", **filter_args)
         
         return render_template('logs.html', 
                              detections=formatted_detections,
@@ -876,8 +2592,13 @@ def logs():
                              total_pages=total_pages,
                              has_prev=has_prev,
                              has_next=has_next,
+                             first_url=first_url,
+                             prev_url=prev_url,
+                             next_url=next_url,
+                             cameras=cameras,
                              name_filter=name_filter,
                              known_filter=known_filter,
+                             camera_filter=camera_filter,
                              date_from=date_from,
                              date_to=date_to)
         
@@ -899,9 +2620,13 @@ def delete_detection(detection_id):
             return jsonify({'success': False, 'error': 'Erkennung nicht gefunden'})
         
        
+        day_from, day_to = get_detection_day_range(cursor, " WHERE id = ?", [detection_id])
         cursor.execute("DELETE FROM face_detections WHERE id = ?", (detection_id,))
+        if day_from:
+            rebuild_detection_stats(cursor, day_from, day_to)
         connection.commit()
         connection.close()
+        invalidate_detection_count()
         
         return jsonify({'success': True, 'message': 'Erkennung gelöscht'})
         
@@ -925,10 +2650,14 @@ def bulk_delete_detections():
         placeholders = ','.join('?' * len(detection_ids))
         query = f"DELETE FROM face_detections WHERE id IN ({placeholders})"
         
+        day_from, day_to = get_detection_day_range(cursor, f" WHERE id IN ({placeholders})", detection_ids)
         cursor.execute(query, detection_ids)
         deleted_count = cursor.rowcount
+        if deleted_count and day_from:
+            rebuild_detection_stats(cursor, day_from, day_to)
         connection.commit()
         connection.close()
+        invalidate_detection_count()
         
         return jsonify({
             'success': True, 
@@ -957,8 +2686,11 @@ def clear_all_detections():
         
        
         cursor.execute("DELETE FROM face_detections")
+        cursor.execute("DELETE FROM face_detection_stats")
+        cursor.execute("DELETE FROM face_detection_stats_names")
         connection.commit()
         connection.close()
+        invalidate_detection_count()
         
         return jsonify({
             'success': True, 
@@ -1004,10 +2736,7 @@ def capture_photo():
         
   
         try:
-            response = requests.get(f"http://{ip_address}/?action=snapshot", 
-                                   timeout=5,
-                                   headers={'User-Agent': 'HomeShieldAI/1.0'})
-            response.raise_for_status()
+            image_data = snapshot_cache.get(ip_address, timeout=5)
         except requests.exceptions.RequestException as e:
             connection.close()
             return jsonify({'success': False, 'error': f'Fehler beim Abrufen des Fotos: {str(e)}'})
@@ -1024,12 +2753,12 @@ def capture_photo():
         
        
         with open(filepath, 'wb') as f:
-            f.write(response.content)
+            f.write(image_data)
         
       
         relative_path = f"static/pictures/captures/{filename}"
         
-        n
+        
         cursor.execute("INSERT INTO captures (pfad) VALUES (?)", (relative_path,))
         connection.commit()
         connection.close()
@@ -1107,24 +2836,15 @@ def delete_account():
 def add_face():  
     try:
         name = request.form.get('name', '').strip()
+        # Mit face_id wird ein weiteres Bild zu einer vorhandenen Person hinzugefügt
+        face_id = request.form.get('face_id', type=int)
         
-        if not name:
+        if not name and not face_id:
             return redirect(url_for('faces', message='Name ist erforderlich', message_type='error'))
         
        
-        faces_json_path = get_faces_json_path()
-        gesicht_dir = os.path.dirname(faces_json_path)
-        
-     
-        known_faces = []
-        if os.path.exists(faces_json_path):
-            with open(faces_json_path, 'r', encoding='utf-8') as f:
-                known_faces = json.load(f)
-        
-       
-        for face in known_faces:
-            if face['Name'].lower() == name.lower():
-                return redirect(url_for('faces', message=f'Ein Gesicht mit dem Namen "{name}" existiert bereits', message_type='error'))
+        gesicht_dir = os.path.dirname(get_faces_json_path())
+        os.makedirs(gesicht_dir, exist_ok=True)
         
         image_filename = None
         
@@ -1177,15 +2897,14 @@ def add_face():
             
             try:
                 
-                response = fetch_camera_snapshot(camera_ip, timeout=10)
-                response.raise_for_status()
+                image_data = snapshot_cache.get(camera_ip, timeout=10)
                 
                 
                 image_filename = f"{uuid.uuid4()}.jpg"
                 image_path = os.path.join(gesicht_dir, image_filename)
                 
                 with open(image_path, 'wb') as f:
-                    f.write(response.content)
+                    f.write(image_data)
                     
             except Exception as e:
                 return redirect(url_for('faces', message=f'Fehler beim Aufnehmen des Fotos: {str(e)}', message_type='error'))
@@ -1196,17 +2915,6 @@ def add_face():
         if not image_filename:
             return redirect(url_for('faces', message='Fehler beim Verarbeiten des Bildes', message_type='error'))
         
-       
-        new_face = {
-            'Name': name,
-            'Image': image_filename
-        }
-        known_faces.append(new_face)
-        
-      
-        with open(faces_json_path, 'w', encoding='utf-8') as f:
-            json.dump(known_faces, f, ensure_ascii=False, indent=2)
-        
         static_faces_dir = get_static_faces_dir()
         src_path = os.path.join(gesicht_dir, image_filename)
         dst_path = os.path.join(static_faces_dir, image_filename)
@@ -1215,7 +2923,19 @@ def add_face():
             shutil.copy2(src_path, dst_path)
         
        
-        face_recognition.reload_known_faces()
+        # Eindeutigkeit des Namens prüft der Unique-Index (ohne Groß-/Kleinschreibung)
+        try:
+            if face_id:
+                name = face_recognition.add_face_image(face_id, image_filename)
+                if name is None:
+                    remove_face_images([image_filename])
+                    return redirect(url_for('faces', message='Ungültige Gesicht-ID', message_type='error'))
+                return redirect(url_for('faces', message=f'Weiteres Bild für "{name}" wurde hinzugefügt', message_type='success'))
+
+            face_recognition.create_known_face(name, image_filename)
+        except sqlite3.IntegrityError:
+            remove_face_images([image_filename])
+            return redirect(url_for('faces', message=f'Ein Gesicht mit dem Namen "{name}" existiert bereits', message_type='error'))
         
         return redirect(url_for('faces', message=f'Gesicht "{name}" wurde erfolgreich hinzugefügt', message_type='success'))
         
@@ -1227,45 +2947,14 @@ def add_face():
 @login_required  
 def delete_face(face_id): 
     try:
-      
-        faces_json_path = get_faces_json_path()
-        gesicht_dir = os.path.dirname(faces_json_path)
-        
-        if not os.path.exists(faces_json_path):
-            return jsonify({'success': False, 'message': 'Keine Gesichter gefunden'})
-        
-        with open(faces_json_path, 'r', encoding='utf-8') as f:
-            known_faces = json.load(f)
-        
-       
-        if 1 <= face_id <= len(known_faces):
-            face_to_delete = known_faces[face_id - 1]
-            face_name = face_to_delete['Name']
-            image_filename = face_to_delete['Image']
-            
-           
-            known_faces.pop(face_id - 1)
-            
-           
-            with open(faces_json_path, 'w', encoding='utf-8') as f:
-                json.dump(known_faces, f, ensure_ascii=False, indent=2)
-            
-        
-            image_paths = [
-                os.path.join(gesicht_dir, image_filename),
-                os.path.join(get_static_faces_dir(), image_filename)
-            ]
-            
-            for path in image_paths:
-                if os.path.exists(path):
-                    os.remove(path)
-            
-            
-            face_recognition.reload_known_faces()
-            
-            return jsonify({'success': True, 'message': f'Gesicht "{face_name}" wurde gelöscht'})
-        else:
+        deleted = face_recognition.delete_known_face(face_id)
+        if deleted is None:
             return jsonify({'success': False, 'message': 'Ungültige Gesicht-ID'})
+
+        face_name, image_files = deleted
+        remove_face_images(image_files)
+        
+        return jsonify({'success': True, 'message': f'Gesicht "{face_name}" wurde gelöscht'})
             
     except Exception as e:
         print(f"Fehler beim Löschen des Gesichts: {e}")
@@ -1282,33 +2971,14 @@ def update_face_name(face_id):
         if not new_name:
             return jsonify({'success': False, 'message': 'Name ist erforderlich'})
        
-        faces_json_path = get_faces_json_path()
-        
-        if not os.path.exists(faces_json_path):
-            return jsonify({'success': False, 'message': 'Keine Gesichter gefunden'})
-        
-        with open(faces_json_path, 'r', encoding='utf-8') as f:
-            known_faces = json.load(f)
-        
-      
-        if not (1 <= face_id <= len(known_faces)):
+        try:
+            old_name = face_recognition.rename_known_face(face_id, new_name)
+        except sqlite3.IntegrityError:
+            return jsonify({'success': False, 'message': f'Ein Gesicht mit dem Namen "{new_name}" existiert bereits'})
+
+        if old_name is None:
             return jsonify({'success': False, 'message': 'Ungültige Gesicht-ID'})
         
-     
-        for i, face in enumerate(known_faces):
-            if i != (face_id - 1) and face['Name'].lower() == new_name.lower():
-                return jsonify({'success': False, 'message': f'Ein Gesicht mit dem Namen "{new_name}" existiert bereits'})
-        
-      
-        old_name = known_faces[face_id - 1]['Name']
-        known_faces[face_id - 1]['Name'] = new_name
-      
-        with open(faces_json_path, 'w', encoding='utf-8') as f:
-            json.dump(known_faces, f, ensure_ascii=False, indent=2)
-        
-     
-        face_recognition.reload_known_faces()
-        
         return jsonify({'success': True, 'message': f'Name erfolgreich von "{old_name}" zu "{new_name}" geändert'})
         
     except Exception as e:
@@ -1332,14 +3002,13 @@ def recognize_face_from_camera(camera_id):
         camera_name, ip_address = camera_data
         
       
-        image_url = f"http://{ip_address}/?action=snapshot"
-        response = requests.get(image_url, timeout=5)
-        
-        if response.status_code != 200:
+        try:
+            image_data = snapshot_cache.get(ip_address, timeout=5)
+        except requests.exceptions.HTTPError:
             return jsonify({'success': False, 'error': 'Konnte kein Foto von der Kamera aufnehmen'})
         
         
-        result = face_recognition.detect_faces_in_image(response.content, camera_id=camera_id)
+        result = face_recognition.detect_faces_in_image(image_data, camera_id=camera_id)
         
         return jsonify({
             'success': True,
@@ -1368,10 +3037,9 @@ def get_camera_preview(camera_id):
         camera_name, ip_address = camera_data
         
    
-        image_url = f"http://{ip_address}/?action=snapshot"
-        response = requests.get(image_url, timeout=10)
-        
-        if response.status_code != 200:
+        try:
+            image_data = snapshot_cache.get(ip_address, timeout=10)
+        except requests.exceptions.HTTPError:
            
             placeholder_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'icons', 'camera.png')
             if os.path.exists(placeholder_path):
@@ -1381,7 +3049,7 @@ def get_camera_preview(camera_id):
                 return jsonify({'error': 'Kamera nicht erreichbar'}), 500
         
   
-        return response.content, 200, {'Content-Type': 'image/jpeg'}
+        return image_data, 200, {'Content-Type': 'image/jpeg'}
         
     except requests.exceptions.Timeout:
         return jsonify({'error': 'Kamera-Timeout'}), 408
@@ -1409,15 +3077,14 @@ def capture_camera_photo(camera_id):
         camera_name, ip_address = camera_data
         
      
-        image_url = f"http://{ip_address}/?action=snapshot"
-        response = requests.get(image_url, timeout=10)
-        
-        if response.status_code != 200:
+        try:
+            image_data = snapshot_cache.get(ip_address, timeout=10)
+        except requests.exceptions.HTTPError:
             return jsonify({'success': False, 'error': 'Konnte kein Foto aufnehmen'})
         
        
         import base64
-        image_data = base64.b64encode(response.content).decode('utf-8')
+        image_data = base64.b64encode(image_data).decode('utf-8')
         
         return jsonify({
             'success': True,
@@ -1463,53 +3130,116 @@ def get_face_detection_statistics():
     try:
         connection = get_db_connection()
         cursor = connection.cursor()
-        
-        # Statistiken für heute
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as total_today,
-                SUM(CASE WHEN is_known = 1 THEN 1 ELSE 0 END) as known_today,
-                COUNT(DISTINCT name) as unique_today
-            FROM face_detections 
-            WHERE date(detected_at) = date('now')
-        """)
-        
-        today_stats = cursor.fetchone()
-        
-        
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as total_week,
-                SUM(CASE WHEN is_known = 1 THEN 1 ELSE 0 END) as known_week,
-                COUNT(DISTINCT name) as unique_week
-            FROM face_detections 
-            WHERE datetime(detected_at) >= datetime('now', '-7 days')
-        """)
-        
-        week_stats = cursor.fetchone()
+
+        # Aus den Rollup-Tabellen; Zeitstempel sind lokale Zeit wie in face_detections
+        now = datetime.datetime.now()
+        periods = {
+            'today': (now.strftime('%Y-%m-%d 00:00:00'), now.strftime('%Y-%m-%d')),
+            'week': ((now - datetime.timedelta(days=7)).strftime('%Y-%m-%d %H:00:00'),
+                     (now - datetime.timedelta(days=7)).strftime('%Y-%m-%d'))
+        }
+
+        statistics = {}
+        for period, (bucket_from, day_from) in periods.items():
+            cursor.execute("""
+                SELECT SUM(total), SUM(known)
+                FROM face_detection_stats
+                WHERE bucket >= ?
+            """, (bucket_from,))
+            total, known = cursor.fetchone()
+
+            cursor.execute("""
+                SELECT COUNT(DISTINCT name)
+                FROM face_detection_stats_names
+                WHERE day >= ?
+            """, (day_from,))
+            unique = cursor.fetchone()[0]
+
+            statistics[period] = {
+                'total': total or 0,
+                'known': known or 0,
+                'unknown': (total or 0) - (known or 0),
+                'unique': unique or 0
+            }
         
         connection.close()
         
-        statistics = {
-            'today': {
-                'total': today_stats[0] or 0,
-                'known': today_stats[1] or 0,
-                'unknown': (today_stats[0] or 0) - (today_stats[1] or 0),
-                'unique': today_stats[2] or 0
-            },
-            'week': {
-                'total': week_stats[0] or 0,
-                'known': week_stats[1] or 0,
-                'unknown': (week_stats[0] or 0) - (week_stats[1] or 0),
-                'unique': week_stats[2] or 0
-            }
-        }
-        
         return jsonify({'success': True, 'statistics': statistics})
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/api/face_detections/statistics/cameras', methods=['GET'])
+@login_required
+def get_face_detection_statistics_by_camera():  
+    try:
+        days = max(1, min(365, request.args.get('days', 1, type=int)))
+        since = datetime.datetime.now() - datetime.timedelta(days=days)
+
+        connection = get_db_connection()
+        cursor = connection.cursor()
+        cursor.execute("""
+            SELECT s.camera_id, cs.name, SUM(s.total), SUM(s.known)
+            FROM face_detection_stats s
+            LEFT JOIN camera_settings cs ON s.camera_id = cs.id
+            WHERE s.bucket >= ?
+            GROUP BY s.camera_id
+            ORDER BY s.camera_id
+        """, (since.strftime('%Y-%m-%d %H:00:00'),))
+
+        cameras = []
+        for camera_id, camera_name, total, known in cursor.fetchall():
+            cameras.append({
+                'camera_id': camera_id or None,
+                'camera_name': camera_name or 'Unbekannte Kamera',
+                'total': total,
+                'known': known,
+                'unknown': total - known
+            })
+
+        connection.close()
+
+        return jsonify({'success': True, 'days': days, 'cameras': cameras})
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/api/face_detections/statistics/hourly', methods=['GET'])
+@login_required
+def get_face_detection_statistics_hourly():  
+    try:
+        hours = max(1, min(24 * 31, request.args.get('hours', 24, type=int)))
+        camera_id = request.args.get('camera_id', type=int)
+        since = datetime.datetime.now() - datetime.timedelta(hours=hours - 1)
+
+        where_clause = "WHERE bucket >= ?"
+        params = [since.strftime('%Y-%m-%d %H:00:00')]
+        if camera_id is not None:
+            where_clause += " AND camera_id = ?"
+            params.append(camera_id)
+
+        connection = get_db_connection()
+        cursor = connection.cursor()
+        cursor.execute(f"""
+            SELECT bucket, SUM(total), SUM(known)
+            FROM face_detection_stats
+            {where_clause}
+            GROUP BY bucket
+            ORDER BY bucket
+        """, params)
+
+        hourly = [
+            {'hour': bucket, 'total': total, 'known': known, 'unknown': total - known}
+            for bucket, total, known in cursor.fetchall()
+        ]
+
+        connection.close()
+
+        return jsonify({'success': True, 'hours': hours, 'hourly': hourly})
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
 @app.route('/api/face_monitoring/start_continuous', methods=['POST'])
 @login_required
 def start_continuous_monitoring():  
@@ -1528,21 +3258,8 @@ def start_continuous_monitoring():
 @app.route('/api/cameras/<int:camera_id>/status', methods=['GET'])
 @login_required
 def get_camera_status(camera_id):  
-    connection = get_db_connection()
-    cursor = connection.cursor()
-    cursor.execute("SELECT ip_address FROM camera_settings WHERE id = ?", (camera_id,))
-    camera = cursor.fetchone()
-    connection.close()
-    
-    if not camera or not camera[0]:
-        return jsonify({'status': 'offline', 'status_text': 'Offline'})
-    
-  
-    try:
-        response = requests.get(f"http://{camera[0]}/?action=snapshot", timeout=3)
-        is_online = response.status_code == 200
-    except:
-        is_online = False
+    status = camera_health.get(camera_id)
+    is_online = bool(status and status['online'])
     
     return jsonify({
         'status': 'online' if is_online else 'offline',
@@ -1552,24 +3269,15 @@ def get_camera_status(camera_id):
 @app.route('/api/cameras/status', methods=['GET'])
 @login_required
 def get_all_cameras_status():  
-    connection = get_db_connection()
-    cursor = connection.cursor()
-    cursor.execute("SELECT id, ip_address FROM camera_settings ORDER BY id")
-    cameras = cursor.fetchall()
-    connection.close()
-    
     status_list = []
-    for camera in cameras:
-        try:
-            response = requests.get(f"http://{camera[1]}/?action=snapshot", timeout=3)
-            is_online = response.status_code == 200
-        except:
-            is_online = False
-            
+    for camera_id, status in sorted(camera_health.get_all().items()):
         status_list.append({
-            'id': camera[0],
-            'status': 'online' if is_online else 'offline',
-            'status_text': 'Online' if is_online else 'Offline'
+            'id': camera_id,
+            'status': 'online' if status['online'] else 'offline',
+            'status_text': 'Online' if status['online'] else 'Offline',
+            'last_seen': status['last_seen'],
+            'last_checked': status['last_checked'],
+            'latency_ms': status['latency_ms']
         })
     
     return jsonify(status_list)
@@ -1592,14 +3300,18 @@ def face_monitoring_status():
     known_faces_count = len(face_recognition.known_faces)
     
   
+    # Letzte 24 h in lokaler Zeit wie detected_at: volle Stunden aus dem Rollup,
+    # nur die angebrochene erste Stunde per Index-Bereich aus face_detections
+    since = datetime.datetime.now() - datetime.timedelta(hours=24)
+    next_bucket = since.replace(minute=0, second=0, microsecond=0) + datetime.timedelta(hours=1)
     connection = get_db_connection()
     cursor = connection.cursor()
-    cursor.execute("""
-        SELECT COUNT(*) as count 
-        FROM face_detections 
-        WHERE detected_at >= datetime('now', '-24 hours')
-    """)
-    recent_detections = cursor.fetchone()['count']
+    cursor.execute("SELECT COALESCE(SUM(total), 0) FROM face_detection_stats WHERE bucket >= ?",
+                   (next_bucket.strftime('%Y-%m-%d %H:00:00'),))
+    recent_detections = cursor.fetchone()[0]
+    cursor.execute("SELECT COUNT(*) FROM face_detections WHERE detected_at >= ? AND detected_at < ?",
+                   (since.strftime('%Y-%m-%d %H:%M:%S'), next_bucket.strftime('%Y-%m-%d %H:%M:%S')))
+    recent_detections += cursor.fetchone()[0]
     connection.close()
     
     
@@ -1613,6 +3325,64 @@ def face_monitoring_status():
         'monitoring': monitoring_status
     })
 
+@app.route('/api/events', methods=['GET'])
+@login_required
+def event_stream():  
+    """Server-Sent Events: Erkennungen und Statusänderungen statt Polling"""
+    subscriber = event_broker.subscribe()
+
+    def generate():
+        try:
+            yield f"event: status\ndata: {json.dumps(face_monitoring.get_status())}\n\n"
+            for camera_status in face_recognition.get_camera_face_status().values():
+                yield f"event: camera_faces\ndata: {json.dumps(camera_status)}\n\n"
+
+            while True:
+                try:
+                    yield subscriber.get(timeout=15)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+        finally:
+            event_broker.unsubscribe(subscriber)
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/metrics', methods=['GET'])
+@login_required
+def get_metrics():  
+    # ?format=prometheus (oder Accept: text/plain) liefert das Prometheus-Textformat, sonst JSON
+    wants_text = request.args.get('format') == 'prometheus' or (
+        request.accept_mimetypes.best_match(['application/json', 'text/plain']) == 'text/plain')
+    if wants_text:
+        return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+    return jsonify({'success': True, **metrics.to_dict(), 'pipeline': face_monitoring.get_pipeline_stats()})
+
+@app.route('/api/face_monitoring/pipeline', methods=['GET'])
+@login_required
+def get_pipeline_stats():  
+    return jsonify({'success': True, **face_monitoring.get_pipeline_stats()})
+
+@app.route('/api/face_monitoring/schedule', methods=['GET'])
+@login_required
+def get_monitoring_schedule():  
+    return jsonify({'success': True, 'cameras': face_monitoring.get_schedule()})
+
+@app.route('/api/face_monitoring/tracks', methods=['GET'])
+@login_required
+def get_face_tracks():  
+    return jsonify({'success': True, 'cameras': face_recognition.get_active_tracks()})
+
+@app.route('/api/face_monitoring/motion', methods=['GET'])
+@login_required
+def get_motion_stats():  
+    return jsonify({'success': True, 'cameras': face_monitoring.get_motion_stats()})
+
+@app.route('/api/streams/status', methods=['GET'])
+@login_required
+def get_streams_status():  
+    return jsonify({'success': True, 'streams': stream_manager.get_status()})
+
 @app.route('/api/face_monitoring/start', methods=['POST'])
 @login_required
 def start_face_monitoring():  
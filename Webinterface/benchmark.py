@@ -0,0 +1,271 @@
+"""Offline-Benchmark für FastFaceRecognition (ohne Netzwerk und Kameras).
+
+Pro Galeriegröße läuft ein eigener Prozess mit einer leeren Temp-Datenbank
+(HOMESHIELD_BASE_DIR). Die Galerie besteht aus synthetischen Encodings plus den
+echten Fixture-Gesichtern, die Frames werden aus den Fixture-Bildern in mehreren
+Auflösungen erzeugt. Gemessen werden Ladezeit der Galerie, Latenz pro Frame
+(inkl. Aufschlüsselung nach Stufen aus /api/metrics), Frames pro Sekunde und
+Spitzen-Speicher. Das Ergebnis ist JSON, damit Läufe über Commits hinweg
+verglichen werden können:
+
+    python benchmark.py --sizes 10,100,1000,10000 --output bench.json
+    python benchmark.py --fixtures /pfad/zu/aufnahmen --resolutions 1920x1080
+"""
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from gallery_index import make_synthetic_gallery
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_FIXTURES = os.path.join(BASE_DIR, 'static', 'faces')
+DEFAULT_SIZES = (10, 100, 1000, 10000)
+DEFAULT_RESOLUTIONS = ('640x360', '1280x720', '1920x1080')
+
+
+def _peak_rss_mb():  # Höchststand des Arbeitsspeichers dieses Prozesses
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)  # macOS: Bytes, Linux: KB
+
+
+def _percentiles(values_ms):
+    values_ms = np.asarray(values_ms)
+    return {
+        'mean_ms': round(float(values_ms.mean()), 2),
+        'p50_ms': round(float(np.percentile(values_ms, 50)), 2),
+        'p95_ms': round(float(np.percentile(values_ms, 95)), 2),
+        'max_ms': round(float(values_ms.max()), 2)
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def load_fixture_images(fixtures_dir):  # Alle Bilder eines Ordners als RGB-Arrays
+    images = []
+    for file_name in sorted(os.listdir(fixtures_dir)):
+        if file_name.lower().endswith(('.jpg', '.jpeg', '.png')):
+            with Image.open(os.path.join(fixtures_dir, file_name)) as image:
+                images.append((file_name, np.asarray(image.convert('RGB'))))
+    if not images:
+        raise SystemExit(f"❌ Keine Fixture-Bilder in {fixtures_dir}")
+    return images
+
+
+def make_frames(images, resolutions, quality=85):  # Kamera-ähnliche JPEG-Frames: jedes Bild in jeder Auflösung + ein leerer Frame
+    frames = []
+    for resolution in resolutions:
+        width, height = (int(v) for v in resolution.split('x'))
+        for file_name, rgb in images:
+            buf = io.BytesIO()
+            Image.fromarray(rgb).resize((width, height), Image.BILINEAR).save(buf, 'JPEG', quality=quality)
+            frames.append({'name': f'{file_name}@{resolution}', 'resolution': resolution, 'data': buf.getvalue()})
+
+        # Rauschen ohne Gesicht: misst den Pfad, der bei leeren Szenen am häufigsten läuft
+        noise = np.random.default_rng(0).integers(0, 255, (height, width, 3), dtype=np.uint8)
+        buf = io.BytesIO()
+        Image.fromarray(noise).save(buf, 'JPEG', quality=quality)
+        frames.append({'name': f'noise@{resolution}', 'resolution': resolution, 'data': buf.getvalue()})
+    return frames
+
+
+def prepare_base_dir(base_dir):  # Leere Datenbank mit dem kompletten Schema der mitgelieferten homeshieldAI.db anlegen
+    # Tabellen zuerst, dann Views, Indizes und Trigger. init_db() läuft danach beim Import von app.py gegen
+    # diese Datenbank und migriert sie wie beim Start im Betrieb. Rückgabe: Herkunft des Schemas fürs JSON.
+    os.makedirs(os.path.join(base_dir, 'static', 'faces'), exist_ok=True)
+    source = sqlite3.connect(f"file:{os.path.join(BASE_DIR, 'homeshieldAI.db')}?mode=ro", uri=True)
+    target = sqlite3.connect(os.path.join(base_dir, 'homeshieldAI.db'))
+    schema = {'source': 'homeshieldAI.db', 'table': 0, 'view': 0, 'index': 0, 'trigger': 0, 'migrations': 'app.init_db'}
+    try:
+        for object_type, sql in source.execute("""
+                SELECT type, sql FROM sqlite_master
+                WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%'
+                ORDER BY CASE type WHEN 'table' THEN 0 WHEN 'view' THEN 1 WHEN 'index' THEN 2 ELSE 3 END, rowid
+                """):
+            target.execute(sql)
+            schema[object_type] += 1
+        target.commit()
+    finally:
+        source.close()
+        target.close()
+    return schema
+
+
+def populate_gallery(db_path, identities, per_identity, fixture_encodings, seed):  # Synthetische Personen + Fixture-Gesichter eintragen
+    gallery, _ = make_synthetic_gallery(identities, per_identity, queries=1, seed=seed)
+    connection = sqlite3.connect(db_path)
+    try:
+        with connection:
+            connection.execute("DELETE FROM known_face_images")
+            connection.execute("DELETE FROM known_faces")
+            for person in range(identities):
+                face_id = connection.execute("INSERT INTO known_faces (name) VALUES (?)",
+                                             (f'Person {person:05d}',)).lastrowid
+                connection.executemany(
+                    "INSERT INTO known_face_images (face_id, image, encoding) VALUES (?, ?, ?)",
+                    [(face_id, f'bench_{person:05d}_{i}.jpg',
+                      np.asarray(gallery[person * per_identity + i], dtype=np.float64).tobytes())
+                     for i in range(per_identity)])
+            for file_name, encoding in fixture_encodings:
+                face_id = connection.execute("INSERT INTO known_faces (name) VALUES (?)",
+                                             (f'Fixture {file_name}',)).lastrowid
+                connection.execute("INSERT INTO known_face_images (face_id, image, encoding) VALUES (?, ?, ?)",
+                                   (face_id, file_name, np.asarray(encoding, dtype=np.float64).tobytes()))
+    finally:
+        connection.close()
+
+
+def run_scenario(options):  # Eine Galeriegröße; läuft in einem eigenen Prozess, damit Speicherwerte nicht überlappen
+    base_dir = tempfile.mkdtemp(prefix='homeshield-bench-')
+    try:
+        webinterface_dir = os.path.join(base_dir, 'Webinterface')
+        schema = prepare_base_dir(webinterface_dir)
+        os.environ['HOMESHIELD_BASE_DIR'] = webinterface_dir
+
+        # app.py schreibt Statusmeldungen auf stdout; das bleibt für das JSON-Ergebnis frei
+        with contextlib.redirect_stdout(sys.stderr):
+            import app
+            import face_recognition as fr
+
+            recognizer = app.face_recognition
+            recognizer.detection_workers = options['workers']
+
+            images = load_fixture_images(options['fixtures'])
+            fixture_encodings = [(name, enc[0]) for name, enc in
+                                 ((name, fr.face_encodings(rgb)) for name, rgb in images) if enc]
+            frames = make_frames(images, options['resolutions'])
+
+            db_path = app.get_db_path()
+            populate_gallery(db_path, options['identities'], options['per_identity'], fixture_encodings,
+                             options['seed'])
+
+            load_ms = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                recognizer.reload_known_faces()
+                load_ms.append((time.perf_counter() - started) * 1000)
+
+            # Eigener Durchlauf unter tracemalloc, damit dessen Overhead die Ladezeiten nicht verfälscht
+            tracemalloc.start()
+            recognizer.reload_known_faces()
+            _, gallery_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            known_faces, matrix, _, index = recognizer._gallery
+
+            for frame in frames:  # Aufwärmen: Worker-Pool, dlib-Modelle, Decode-Puffer
+                recognizer.detect_faces_in_image(frame['data'], camera_id='warmup')
+            app.metrics.reset()
+
+            per_resolution = {}
+            latencies = []
+            known = total_faces = 0
+            started = time.perf_counter()
+            for _ in range(options['repeat']):
+                for frame in frames:
+                    frame_started = time.perf_counter()
+                    result = recognizer.detect_faces_in_image(frame['data'], camera_id=frame['resolution'])
+                    elapsed_ms = (time.perf_counter() - frame_started) * 1000
+                    latencies.append(elapsed_ms)
+                    per_resolution.setdefault(frame['resolution'], []).append(elapsed_ms)
+                    total_faces += result['total_faces']
+                    known += sum(1 for face in result['faces'] if face['is_known'])
+            wall = time.perf_counter() - started
+
+            stages = {stage: round(float(np.mean([s['avg_ms'] for s in by_camera.values()])), 2)
+                      for stage, by_camera in app.metrics.to_dict()['stages'].items()}
+            recognizer.shutdown()
+
+        return {
+            'identities': options['identities'],
+            'schema': schema,
+            'gallery_encodings': int(sum(len(kf['encodings']) for kf in known_faces)),
+            'gallery_persons': len(known_faces),
+            'index': index.name,
+            'gallery_load': _percentiles(load_ms),
+            'gallery_peak_alloc_mb': round(gallery_peak / (1024 * 1024), 2),
+            'frames': len(latencies),
+            'frame_latency': _percentiles(latencies),
+            'frame_latency_by_resolution': {res: _percentiles(values) for res, values in per_resolution.items()},
+            'stage_avg_ms': stages,
+            'fps': round(len(latencies) / wall, 2) if wall else None,
+            'faces_detected': total_faces,
+            'faces_known': known,
+            'peak_rss_mb': _peak_rss_mb()
+        }
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+
+def benchmark(sizes=DEFAULT_SIZES, fixtures=DEFAULT_FIXTURES, resolutions=DEFAULT_RESOLUTIONS, per_identity=1,
+              repeat=3, workers=0, seed=0):
+    results = {
+        'started_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'settings': {'fixtures': fixtures, 'resolutions': list(resolutions), 'per_identity': per_identity,
+                     'repeat': repeat, 'workers': workers, 'seed': seed},
+        'scenarios': []
+    }
+
+    context = multiprocessing.get_context('spawn')
+    for identities in sizes:
+        print(f"⏱️ Galerie mit {identities} Identitäten ...", file=sys.stderr)
+        options = {'identities': identities, 'fixtures': fixtures, 'resolutions': list(resolutions),
+                   'per_identity': per_identity, 'repeat': repeat, 'workers': workers, 'seed': seed}
+        with context.Pool(1) as pool:
+            results['scenarios'].append(pool.apply(run_scenario, (options,)))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Offline-Benchmark der Gesichtserkennung mit synthetischen Galerien')
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help='Galeriegrößen (Identitäten), kommagetrennt')
+    parser.add_argument('--fixtures', default=DEFAULT_FIXTURES, help='Ordner mit Fixture-Bildern (Standard: static/faces)')
+    parser.add_argument('--resolutions', default=','.join(DEFAULT_RESOLUTIONS), help='Frame-Auflösungen, z. B. 1280x720')
+    parser.add_argument('--per-identity', type=int, default=1, help='Encodings pro synthetischer Identität')
+    parser.add_argument('--repeat', type=int, default=3, help='Durchläufe für Ladezeit und Frames')
+    parser.add_argument('--workers', type=int, default=0, help='Erkennungs-Prozesse (0 = im Benchmark-Prozess)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='JSON zusätzlich in diese Datei schreiben')
+    args = parser.parse_args()
+
+    report = benchmark([int(v) for v in args.sizes.split(',')], args.fixtures, args.resolutions.split(','),
+                       args.per_identity, args.repeat, args.workers, args.seed)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    print(output)
@@ -0,0 +1,137 @@
+"""Rechenintensiver Teil der Gesichtserkennung für die Worker-Prozesse.
+
+Das Modul hat beim Import keine Nebenwirkungen (keine Datenbank, keine Threads,
+keine Galerie). Die Erkennungs-Prozesse werden per spawn gestartet und laden nur
+dieses Modul, nicht app.py.
+"""
+
+import io
+import threading
+import time
+
+import cv2
+import numpy as np
+import face_recognition as fr
+from PIL import Image
+
+
+def init_worker():  # Initializer des Prozess-Pools
+    # Parallelität kommt über die Prozesse; OpenCV-Threads pro Prozess würden sich nur gegenseitig verdrängen
+    cv2.setNumThreads(1)
+
+
+_decode_buffers = threading.local()  # Pro Thread/Prozess wiederverwendeter RGB-Zielpuffer
+
+REDUCED_DECODE_FLAGS = {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+
+def get_decode_reduction(scale):  # Größter JPEG-Verkleinerungsfaktor (2/4/8), der die Erkennungs-Skalierung nicht unterschreitet
+    reduction = 1
+    for factor in (2, 4, 8):
+        if scale and scale * factor <= 1:
+            reduction = factor
+    return reduction
+
+def _rgb_buffer(shape):
+    buffer = getattr(_decode_buffers, 'rgb', None)
+    if buffer is None or buffer.shape != shape:
+        buffer = _decode_buffers.rgb = np.empty(shape, dtype=np.uint8)
+    return buffer
+
+def decode_image(image_data, reduction=1):  # JPEG/PNG-Bytes oder Array -> RGB-Array (uint8, 3 Kanäle)
+    # Achtung: Bei Bytes liegt das Ergebnis im wiederverwendeten Thread-Puffer und ist nur bis zum nächsten Aufruf gültig.
+    if isinstance(image_data, (bytes, bytearray, memoryview)):
+        buffer = np.frombuffer(image_data, dtype=np.uint8)
+        flags = REDUCED_DECODE_FLAGS.get(reduction, cv2.IMREAD_COLOR)
+        bgr_image = cv2.imdecode(buffer, flags)  # Graustufen/Alpha werden hier bereits auf 3 Kanäle BGR gebracht
+        if bgr_image is not None:
+            rgb_image = _rgb_buffer(bgr_image.shape)
+            cv2.cvtColor(bgr_image, cv2.COLOR_BGR2RGB, dst=rgb_image)
+            return rgb_image
+
+        # Formate, die OpenCV nicht lesen kann, über PIL
+        pil_image = Image.open(io.BytesIO(image_data)).convert('RGB')
+        if reduction > 1:
+            pil_image = pil_image.resize((max(1, pil_image.width // reduction), max(1, pil_image.height // reduction)))
+        return np.asarray(pil_image)
+
+    # Arrays werden wie von PIL geliefert in RGB(A)- bzw. Graustufen-Reihenfolge erwartet
+    image = image_data
+    if image.dtype != np.uint8:
+        image = cv2.convertScaleAbs(image)
+    if image.ndim == 2 or image.shape[2] == 1:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+    elif image.shape[2] == 4:
+        image = cv2.cvtColor(image, cv2.COLOR_RGBA2RGB)
+    if reduction > 1:
+        image = cv2.resize(image, (max(1, image.shape[1] // reduction), max(1, image.shape[0] // reduction)),
+                           interpolation=cv2.INTER_AREA)
+    return np.ascontiguousarray(image)
+
+def get_scan_regions(region=None, roi=None):  # Zu durchsuchende Ausschnitte: Bewegungsbereich geschnitten mit den ROIs
+    if not roi:
+        return [region or (0.0, 0.0, 1.0, 1.0)]
+    if region is None:
+        return list(roi)
+
+    regions = []
+    for x0, y0, x1, y1 in roi:
+        rect = (max(x0, region[0]), max(y0, region[1]), min(x1, region[2]), min(y1, region[3]))
+        if rect[2] > rect[0] and rect[3] > rect[1]:
+            regions.append(rect)
+    return regions
+
+def box_iou(a, b):  # Intersection over Union zweier Boxen im face_recognition-Format (top, right, bottom, left)
+    inter_h = min(a[2], b[2]) - max(a[0], b[0])
+    inter_w = min(a[1], b[1]) - max(a[3], b[3])
+    if inter_h <= 0 or inter_w <= 0:
+        return 0.0
+    intersection = inter_h * inter_w
+    union = (a[2] - a[0]) * (a[1] - a[3]) + (b[2] - b[0]) * (b[1] - b[3]) - intersection
+    return intersection / union if union > 0 else 0.0
+
+def locate_and_encode_faces(image_data, region=None, scale=1.0, roi=None, skip_boxes=None, iou_threshold=0.3):  # Rechenintensiver Teil der Erkennung, läuft in den Worker-Prozessen
+    # region:     optionaler Ausschnitt (x0, y0, x1, y1) relativ zur Bildgröße, z.B. der Bewegungsbereich
+    # scale:      Gesichter auf einer verkleinerten Kopie suchen, Encodings aber in voller Auflösung berechnen
+    # roi:        Liste relativer Rechtecke; Bereiche außerhalb werden nie durchsucht
+    # skip_boxes: Boxen bereits verfolgter Gesichter; überlappende Funde werden nicht erneut encodiert
+    # Rückgabe: (locations, encodings nur für encodierte Gesichter, encoded-Flag pro Location,
+    #            Laufzeiten {'decode', 'locate', 'encode'} in Sekunden)
+    started = time.perf_counter()
+    scale = scale if scale and 0 < scale < 1 else 1.0
+    # Bei starker Verkleinerung schon beim JPEG-Decoding reduzieren; die Restskalierung übernimmt cv2.resize
+    reduction = get_decode_reduction(scale)
+    scale *= reduction
+    rgb_image = decode_image(image_data, reduction)
+    height, width = rgb_image.shape[:2]
+    decoded = time.perf_counter()
+
+    face_locations = []
+    for rx0, ry0, rx1, ry1 in get_scan_regions(region, roi):
+        x0, y0 = int(rx0 * width), int(ry0 * height)
+        x1, y1 = int(np.ceil(rx1 * width)), int(np.ceil(ry1 * height))
+        if x1 <= x0 or y1 <= y0:
+            continue
+
+        crop = rgb_image[y0:y1, x0:x1]
+        if scale < 1.0:
+            crop = cv2.resize(crop, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        else:
+            crop = np.ascontiguousarray(crop)
+
+        for top, right, bottom, left in fr.face_locations(crop, model="hog"):
+            location = (min(height, int(top / scale) + y0), min(width, int(right / scale) + x0),
+                        min(height, int(bottom / scale) + y0), min(width, int(left / scale) + x0))
+            # Gesichter in überlappenden ROIs nur einmal zählen
+            center_y, center_x = (location[0] + location[2]) // 2, (location[1] + location[3]) // 2
+            if any(t <= center_y <= b and l <= center_x <= r for t, r, b, l in face_locations):
+                continue
+            face_locations.append(location)
+
+    full_locations = [tuple(v * reduction for v in location) for location in face_locations]
+    encoded = [not skip_boxes or all(box_iou(location, box) < iou_threshold for box in skip_boxes)
+               for location in full_locations]
+
+    located = time.perf_counter()
+    face_encodings = fr.face_encodings(rgb_image, [l for l, e in zip(face_locations, encoded) if e])
+    timings = {'decode': decoded - started, 'locate': located - decoded, 'encode': time.perf_counter() - located}
+    return full_locations, np.asarray(face_encodings, dtype=np.float32).reshape(-1, 128), encoded, timings
@@ -0,0 +1,198 @@
+"""Suchindizes für die Galerie bekannter Gesichter.
+
+BruteForceIndex vergleicht jede Anfrage mit allen Encodings (exakt). IVFIndex teilt
+die Galerie per k-Means in Zellen auf und durchsucht pro Anfrage nur die nächsten
+Zellen (approximativ, reines NumPy). build_gallery_index wählt anhand der Größe.
+
+Benchmark (Recall und Latenz beider Indizes auf synthetischen Encodings):
+
+    python gallery_index.py --identities 5000 --per-identity 2 --queries 500
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+ANN_THRESHOLD = 10000  # Ab so vielen Encodings wird der approximative Index verwendet (Break-even lt. Benchmark)
+
+
+def _squared_distances(queries, matrix, matrix_sq=None):  # ||q - m||² für alle Paare als eine Matrixmultiplikation
+    if matrix_sq is None:
+        matrix_sq = np.einsum('ij,ij->i', matrix, matrix)
+    sq_dist = (np.einsum('ij,ij->i', queries, queries)[:, None]
+               + matrix_sq[None, :]
+               - 2.0 * queries @ matrix.T)
+    return np.maximum(sq_dist, 0.0)
+
+
+def _top_k(distances, k):  # (Indizes, Distanzen) der k kleinsten Werte pro Zeile, aufsteigend sortiert
+    k = min(k, distances.shape[1])
+    if k < distances.shape[1]:
+        candidates = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(distances.shape[1]), distances.shape)
+    candidate_dist = np.take_along_axis(distances, candidates, axis=1)
+    order = np.argsort(candidate_dist, axis=1)
+    return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(candidate_dist, order, axis=1)
+
+
+class BruteForceIndex:  # Exakte Suche über die komplette Matrix
+
+    name = 'brute_force'
+
+    def __init__(self, matrix):
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self._matrix_sq = np.einsum('ij,ij->i', self.matrix, self.matrix)
+
+    def __len__(self):
+        return len(self.matrix)
+
+    def search(self, queries, k):  # -> (Indizes, euklidische Distanzen), je (len(queries), min(k, len(self)))
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.matrix.shape[1])
+        if len(self.matrix) == 0 or len(queries) == 0:
+            return np.empty((len(queries), 0), dtype=np.int64), np.empty((len(queries), 0), dtype=np.float32)
+        indices, sq_dist = _top_k(_squared_distances(queries, self.matrix, self._matrix_sq), k)
+        return indices, np.sqrt(sq_dist)
+
+
+class IVFIndex:  # Inverted File Index: k-Means-Zellen, gesucht wird nur in den n_probe nächsten Zellen
+
+    name = 'ivf'
+
+    def __init__(self, matrix, n_lists=None, n_probe=None, iterations=10, sample_size=20000, seed=0):
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        count = len(self.matrix)
+        self.n_lists = max(1, min(count, n_lists or int(np.sqrt(count))))
+        self.n_probe = max(1, min(self.n_lists, n_probe or max(4, self.n_lists // 8)))
+
+        self.centroids = self._train(iterations, sample_size, np.random.default_rng(seed))
+        assignments = self._assign(self.matrix)
+
+        # Encodings nach Zelle sortiert ablegen, damit jede Zelle ein zusammenhängender Block ist
+        self._order = np.argsort(assignments, kind='stable')
+        self._offsets = np.searchsorted(assignments[self._order], np.arange(self.n_lists + 1))
+        self._sorted_matrix = self.matrix[self._order]
+        self._sorted_sq = np.einsum('ij,ij->i', self._sorted_matrix, self._sorted_matrix)
+        # Nur belegte Zellen proben: Zentren ohne Encodings würden die Probe sonst ins Leere laufen lassen
+        self._filled_cells = np.flatnonzero(np.diff(self._offsets) > 0)
+
+    def __len__(self):
+        return len(self.matrix)
+
+    def _assign(self, points):
+        assignments = np.empty(len(points), dtype=np.int64)
+        for start in range(0, len(points), 4096):  # blockweise, damit die Distanzmatrix klein bleibt
+            block = points[start:start + 4096]
+            assignments[start:start + len(block)] = np.argmin(_squared_distances(block, self.centroids), axis=1)
+        return assignments
+
+    def _train(self, iterations, sample_size, rng):  # k-Means (Lloyd) auf einer Stichprobe der Galerie
+        sample = self.matrix
+        if len(sample) > sample_size:
+            sample = sample[rng.choice(len(sample), sample_size, replace=False)]
+        centroids = sample[rng.choice(len(sample), self.n_lists, replace=False)].copy()
+
+        for _ in range(iterations):
+            assignments = np.argmin(_squared_distances(sample, centroids), axis=1)
+            counts = np.bincount(assignments, minlength=self.n_lists)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+            # Leere Zellen mit zufälligen Punkten neu besetzen
+            empty = np.flatnonzero(~filled)
+            if len(empty):
+                centroids[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+        return centroids
+
+    def search(self, queries, k):
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.matrix.shape[1])
+        k = min(k, len(self.matrix))
+        indices = np.full((len(queries), k), -1, dtype=np.int64)
+        distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        if k == 0 or len(queries) == 0:
+            return indices, distances
+
+        probes, _ = _top_k(_squared_distances(queries, self.centroids[self._filled_cells]), self.n_probe)
+        probes = self._filled_cells[probes]
+        for row, (query, cells) in enumerate(zip(queries, probes)):
+            # Zellen sind zusammenhängende Blöcke: über Slices (Views) rechnen statt Zeilen zu kopieren
+            positions, block_dist = [], []
+            query_sq = float(query @ query)
+            for cell in cells:
+                start, end = self._offsets[cell], self._offsets[cell + 1]
+                positions.append(np.arange(start, end))
+                block_dist.append(self._sorted_sq[start:end] - 2.0 * (self._sorted_matrix[start:end] @ query))
+            positions = np.concatenate(positions)
+            sq_dist = np.maximum(np.concatenate(block_dist) + query_sq, 0.0)[None, :]
+            found, found_dist = _top_k(sq_dist, k)
+            count = found.shape[1]
+            indices[row, :count] = self._order[positions[found[0]]]
+            distances[row, :count] = np.sqrt(found_dist[0])
+        return indices, distances
+
+
+def build_gallery_index(matrix, ann_threshold=ANN_THRESHOLD):  # Kleine Galerien exakt, große über IVF
+    if ann_threshold and len(matrix) >= ann_threshold:
+        return IVFIndex(matrix)
+    return BruteForceIndex(matrix)
+
+
+def make_synthetic_gallery(identities, per_identity=1, queries=500, noise=0.03, seed=0):
+    # Synthetische 128-d-Encodings: Identitäten als Zufallspunkte, Aufnahmen/Anfragen als verrauschte Kopien
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(0.0, 0.09, (identities, 128)).astype(np.float32)
+    gallery = np.repeat(centers, per_identity, axis=0) + rng.normal(0.0, noise, (identities * per_identity, 128))
+    truth = rng.integers(0, identities, queries)
+    probe = centers[truth] + rng.normal(0.0, noise, (queries, 128))
+    return gallery.astype(np.float32), probe.astype(np.float32)
+
+
+def benchmark(identities=5000, per_identity=1, queries=500, k=3, repeat=3, seed=0, **ivf_options):
+    # Recall@k des IVF-Index gegenüber der exakten Suche und Latenzen beider Indizes
+    gallery, probe = make_synthetic_gallery(identities, per_identity, queries, seed=seed)
+
+    results = {'gallery_size': len(gallery), 'queries': queries, 'k': k}
+    start = time.perf_counter()
+    exact = BruteForceIndex(gallery)
+    ivf = IVFIndex(gallery, seed=seed, **ivf_options)
+    results['ivf_build_ms'] = round((time.perf_counter() - start) * 1000, 2)
+    results['n_lists'], results['n_probe'] = ivf.n_lists, ivf.n_probe
+
+    exact_ids, _ = exact.search(probe, k)
+    ivf_ids, _ = ivf.search(probe, k)
+    hits = sum(len(set(a) & set(b)) for a, b in zip(exact_ids, ivf_ids))
+    results['recall_at_k'] = round(hits / exact_ids.size, 4)
+    results['recall_at_1'] = round(float(np.mean(exact_ids[:, 0] == ivf_ids[:, 0])), 4)
+
+    for index in (exact, ivf):
+        # Pro Frame kommen nur wenige Gesichter an, daher Latenz pro Einzelanfrage messen
+        timings = []
+        for _ in range(repeat):
+            for query in probe:
+                start = time.perf_counter()
+                index.search(query[None, :], k)
+                timings.append(time.perf_counter() - start)
+        timings = np.array(timings) * 1000
+        results[index.name] = {
+            'mean_ms': round(float(timings.mean()), 4),
+            'p50_ms': round(float(np.percentile(timings, 50)), 4),
+            'p95_ms': round(float(np.percentile(timings, 95)), 4)
+        }
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Recall/Latenz-Vergleich Brute Force vs. IVF')
+    parser.add_argument('--identities', type=int, default=5000)
+    parser.add_argument('--per-identity', type=int, default=1)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--k', type=int, default=3)
+    parser.add_argument('--n-lists', type=int, default=None)
+    parser.add_argument('--n-probe', type=int, default=None)
+    args = parser.parse_args()
+
+    print(json.dumps(benchmark(args.identities, args.per_identity, args.queries, args.k,
+                               n_lists=args.n_lists, n_probe=args.n_probe), indent=2))
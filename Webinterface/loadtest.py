@@ -0,0 +1,443 @@
+"""Lasttest mit simulierten Kameras und Dashboards (ohne echte Hardware).
+
+Startet konfigurierbar viele Fake-Kameras (?action=snapshot und ?action=stream,
+mit einstellbarer Latenz und Fehlerrate), die App in einem eigenen Prozess mit
+einer Temp-Datenbank (HOMESHIELD_BASE_DIR) und simulierte Dashboards, die die
+Polling-Endpunkte des Dashboards abfragen und /api/events offen halten. Das
+Ergebnis (p50/p99-Latenz und Durchsatz pro Endpunkt, Kamera-Zugriffe,
+/api/metrics der App) wird als JSON ausgegeben:
+
+    python loadtest.py --cameras 20 --dashboards 10 --duration 60
+    python loadtest.py --camera-latency 200 --camera-failure-rate 0.1 --frames /pfad/zu/jpegs
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import random
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import requests
+from PIL import Image
+
+from benchmark import DEFAULT_FIXTURES, load_fixture_images, make_frames, populate_gallery, prepare_base_dir
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+USERNAME, PASSWORD = 'loadtest', 'loadtest'
+BOUNDARY = 'boundarydonotcross'  # wie mjpg-streamer
+
+# Endpunkte, die das Dashboard regelmäßig abfragt (siehe templates/dashboard.html)
+DASHBOARD_ENDPOINTS = (
+    '/api/face_detections/recent?limit=5',
+    '/api/face_detections/statistics',
+    '/api/face_monitoring/status',
+    '/api/cameras/status',
+)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _summary(values_ms, duration):
+    if not values_ms:
+        return {'count': 0}
+    values_ms = np.asarray(values_ms)
+    return {
+        'count': len(values_ms),
+        'per_second': round(len(values_ms) / duration, 2),
+        'p50_ms': round(float(np.percentile(values_ms, 50)), 2),
+        'p90_ms': round(float(np.percentile(values_ms, 90)), 2),
+        'p99_ms': round(float(np.percentile(values_ms, 99)), 2),
+        'max_ms': round(float(values_ms.max()), 2)
+    }
+
+
+def load_frames(frames_dir=None, fixtures=DEFAULT_FIXTURES, resolution='1280x720', moving_frames=20):
+    # Aufgenommene JPEGs aus frames_dir, sonst synthetisch: Fixture-Gesichter und ein bewegtes Rechteck
+    if frames_dir:
+        frames = []
+        for file_name in sorted(os.listdir(frames_dir)):
+            if file_name.lower().endswith(('.jpg', '.jpeg')):
+                with open(os.path.join(frames_dir, file_name), 'rb') as f:
+                    frames.append(f.read())
+        if not frames:
+            raise SystemExit(f"❌ Keine JPEG-Frames in {frames_dir}")
+        return frames
+
+    width, height = (int(v) for v in resolution.split('x'))
+    frames = []
+    for step in range(moving_frames):
+        image = np.full((height, width, 3), 90, dtype=np.uint8)
+        x = int((width - width // 8) * step / max(1, moving_frames - 1))
+        image[height // 3:height // 3 + height // 4, x:x + width // 8] = (200, 160, 120)
+        buf = io.BytesIO()
+        Image.fromarray(image).save(buf, 'JPEG', quality=80)
+        frames.append(buf.getvalue())
+    frames += [frame['data'] for frame in make_frames(load_fixture_images(fixtures), [resolution])]
+    return frames
+
+
+class FakeCamera:  # mjpg-streamer-Nachbau auf 127.0.0.1 mit einstellbarer Latenz und Fehlerrate
+
+    def __init__(self, frames, fps=5, latency_ms=0, jitter_ms=0, failure_rate=0.0, seed=0):
+        self.frames = frames
+        self.fps = fps
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.stats = {'snapshots': 0, 'stream_connections': 0, 'stream_frames': 0, 'failures': 0}
+        self._offset = seed % len(frames)  # Kameras zeigen nicht alle dasselbe Bild
+        self._started = time.monotonic()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def address(self):
+        return f"127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def current_frame(self):
+        index = int((time.monotonic() - self._started) * self.fps) + self._offset
+        return self.frames[index % len(self.frames)]
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _should_fail(self):
+        with self._lock:
+            return self._rng.random() < self.failure_rate
+
+    def _delay(self):
+        with self._lock:
+            delay_ms = self.latency_ms + self._rng.uniform(0, self.jitter_ms)
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+
+    def _make_handler(self):
+        camera = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.0'
+
+            def log_message(self, format, *args):  # keine Zugriffslogs auf stderr
+                pass
+
+            def do_GET(self):
+                action = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query).get('action', [''])[0]
+                if action == 'snapshot':
+                    self._snapshot()
+                elif action == 'stream':
+                    self._stream()
+                else:
+                    self.send_error(404)
+
+            def _snapshot(self):
+                camera._delay()
+                if camera._should_fail():
+                    camera._count('failures')
+                    self.send_error(503, 'Simulierter Kamerafehler')
+                    return
+                frame = camera.current_frame()
+                self.send_response(200)
+                self.send_header('Content-Type', 'image/jpeg')
+                self.send_header('Content-Length', str(len(frame)))
+                self.end_headers()
+                self.wfile.write(frame)
+                camera._count('snapshots')
+
+            def _stream(self):
+                camera._delay()
+                camera._count('stream_connections')
+                self.send_response(200)
+                self.send_header('Content-Type', f'multipart/x-mixed-replace;boundary={BOUNDARY}')
+                self.end_headers()
+                try:
+                    while True:
+                        # Fehler im Stream: Verbindung mitten im Senden abbrechen
+                        if camera._should_fail():
+                            camera._count('failures')
+                            return
+                        frame = camera.current_frame()
+                        self.wfile.write(f'--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n'
+                                         f'Content-Length: {len(frame)}\r\n\r\n'.encode('latin-1'))
+                        self.wfile.write(frame + b'\r\n')
+                        camera._count('stream_frames')
+                        time.sleep(1 / camera.fps)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+        return Handler
+
+
+class DashboardClient:  # Ein angemeldetes Dashboard: Polling-Schleife plus offener Event-Stream
+
+    def __init__(self, base_url, camera_ids, poll_interval=1.0, use_events=True):
+        self.base_url = base_url
+        self.camera_ids = camera_ids
+        self.poll_interval = poll_interval
+        self.use_events = use_events
+        self.latencies = {}  # Endpunkt -> [ms]
+        self.errors = {}
+        self.events = 0
+        self._session = requests.Session()
+        self._stop_event = threading.Event()
+        self._threads = []
+
+    def login(self):
+        response = self._session.post(f"{self.base_url}/login", data={'username': USERNAME, 'password': PASSWORD},
+                                      allow_redirects=False, timeout=10)
+        if response.status_code != 302 or '/dashboard' not in response.headers.get('Location', ''):
+            raise RuntimeError(f"Anmeldung fehlgeschlagen (HTTP {response.status_code})")
+
+    def request(self, method, path, **kwargs):  # Einzelne Anfrage mit der angemeldeten Session
+        return self._session.request(method, f"{self.base_url}{path}", timeout=30, **kwargs)
+
+    def start(self):
+        self._threads.append(threading.Thread(target=self._poll, daemon=True))
+        if self.use_events:
+            self._threads.append(threading.Thread(target=self._listen, daemon=True))
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._session.close()
+
+    def _poll(self):
+        camera_index = 0
+        while not self._stop_event.is_set():
+            endpoints = list(DASHBOARD_ENDPOINTS)
+            if self.camera_ids:  # checkCameraStatus: pro Runde eine Kamera
+                endpoints.append(f"/api/cameras/{self.camera_ids[camera_index % len(self.camera_ids)]}/status")
+                camera_index += 1
+
+            for endpoint in endpoints:
+                key = endpoint.split('?')[0] if '/api/cameras/' not in endpoint else '/api/cameras/<id>/status'
+                started = time.perf_counter()
+                try:
+                    response = self._session.get(f"{self.base_url}{endpoint}", timeout=30, allow_redirects=False)
+                    ok = response.status_code == 200
+                except requests.exceptions.RequestException:
+                    ok = False
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                if ok:
+                    self.latencies.setdefault(key, []).append(elapsed_ms)
+                else:
+                    self.errors[key] = self.errors.get(key, 0) + 1
+            self._stop_event.wait(self.poll_interval)
+
+    def _listen(self):  # /api/events offen halten wie der EventSource im Browser
+        while not self._stop_event.is_set():
+            try:
+                with self._session.get(f"{self.base_url}/api/events", stream=True, timeout=(5, 2)) as response:
+                    for line in response.iter_lines():
+                        if self._stop_event.is_set():
+                            return
+                        if line.startswith(b'event:'):
+                            self.events += 1
+            except requests.exceptions.RequestException:
+                pass  # Lese-Timeout ohne Ereignis: neu verbinden und Stopp prüfen
+
+
+def prepare_database(base_dir, camera_addresses):  # Temp-Datenbank mit Testbenutzer und den Fake-Kameras
+    # -> (Kamera-IDs, Herkunft des Schemas); init_db() migriert die Datenbank beim Start des App-Prozesses
+    schema = prepare_base_dir(base_dir)
+    connection = sqlite3.connect(os.path.join(base_dir, 'homeshieldAI.db'))
+    try:
+        with connection:
+            connection.execute("INSERT INTO users (username, password) VALUES (?, ?)",
+                               (USERNAME, hashlib.sha256(PASSWORD.encode()).hexdigest()))
+            connection.executemany("INSERT INTO camera_settings (name, ip_address) VALUES (?, ?)",
+                                   [(f'Fake-Kamera {i + 1}', address) for i, address in enumerate(camera_addresses)])
+        return [row[0] for row in connection.execute("SELECT id FROM camera_settings ORDER BY id")], schema
+    finally:
+        connection.close()
+
+
+def serve_app(port, gallery, fixtures):  # Läuft im App-Prozess: Galerie anlegen und Flask starten
+    import app
+    import face_recognition as fr
+
+    fixture_encodings = [(name, enc[0]) for name, enc in
+                         ((name, fr.face_encodings(rgb)) for name, rgb in load_fixture_images(fixtures)) if enc]
+    populate_gallery(app.get_db_path(), gallery, 1, fixture_encodings, seed=0)
+    app.face_recognition.reload_known_faces()
+    app.app.run(host='127.0.0.1', port=port, threaded=True, use_reloader=False)
+
+
+def start_app(base_dir, port, gallery, fixtures, log_file):
+    env = dict(os.environ, HOMESHIELD_BASE_DIR=base_dir)
+    process = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--serve', str(port), '--gallery', str(gallery),
+         '--fixtures', fixtures],
+        cwd=BASE_DIR, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+
+    deadline = time.monotonic() + 120  # Import von dlib/face_recognition dauert
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"App-Prozess beendet (Exit-Code {process.returncode})")
+        try:
+            requests.get(f"http://127.0.0.1:{port}/login", timeout=1)
+            return process
+        except requests.exceptions.RequestException:
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("App-Prozess antwortet nicht")
+
+
+def run_load_test(cameras=20, dashboards=10, duration=30, warmup=5, frames_dir=None, fixtures=DEFAULT_FIXTURES,
+                  resolution='1280x720', camera_fps=5, camera_latency=0, camera_jitter=0, camera_failure_rate=0.0,
+                  poll_interval=1.0, monitoring_interval=5, gallery=100, use_events=True):
+    frames = load_frames(frames_dir, fixtures, resolution)
+    fake_cameras = [FakeCamera(frames, camera_fps, camera_latency, camera_jitter, camera_failure_rate, seed=i).start()
+                    for i in range(cameras)]
+
+    base_dir = tempfile.mkdtemp(prefix='homeshield-load-')
+    webinterface_dir = os.path.join(base_dir, 'Webinterface')
+    camera_ids, schema = prepare_database(webinterface_dir, [camera.address for camera in fake_cameras])
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    log_path = os.path.join(base_dir, 'app.log')
+    process = None
+    clients = []
+
+    try:
+        with open(log_path, 'wb') as log_file:
+            print(f"🚀 Starte App auf Port {port} mit {cameras} Fake-Kamera(s) ...", file=sys.stderr)
+            process = start_app(webinterface_dir, port, gallery, fixtures, log_file)
+
+            admin = DashboardClient(base_url, camera_ids)
+            admin.login()
+            admin.request('POST', '/api/face_monitoring/start', json={'interval': monitoring_interval}).raise_for_status()
+
+            clients = [DashboardClient(base_url, camera_ids, poll_interval, use_events) for _ in range(dashboards)]
+            for client in clients:
+                client.login()
+
+            print(f"⏳ Aufwärmen ({warmup}s), dann {duration}s Last mit {dashboards} Dashboard(s) ...", file=sys.stderr)
+            time.sleep(warmup)
+            camera_baseline = [dict(camera.stats) for camera in fake_cameras]
+
+            for client in clients:
+                client.start()
+            time.sleep(duration)
+            for client in clients:
+                client.stop()
+
+            app_metrics = admin.request('GET', '/api/metrics').json()
+            monitoring = admin.request('GET', '/api/face_monitoring/status').json()
+            admin.request('POST', '/api/face_monitoring/stop')
+    except Exception:
+        if os.path.exists(log_path):
+            with open(log_path, 'rb') as f:
+                sys.stderr.write(f.read()[-4000:].decode('utf-8', 'replace'))
+        raise
+    finally:
+        for client in clients:
+            client.stop()
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        for camera in fake_cameras:
+            camera.stop()
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+    latencies, errors = {}, {}
+    for client in clients:
+        for endpoint, values in client.latencies.items():
+            latencies.setdefault(endpoint, []).extend(values)
+        for endpoint, count in client.errors.items():
+            errors[endpoint] = errors.get(endpoint, 0) + count
+    all_latencies = [value for values in latencies.values() for value in values]
+
+    camera_totals = {key: 0 for key in fake_cameras[0].stats} if fake_cameras else {}
+    for camera, baseline in zip(fake_cameras, camera_baseline):
+        for key, value in camera.stats.items():
+            camera_totals[key] += value - baseline[key]
+
+    return {
+        'settings': {'cameras': cameras, 'dashboards': dashboards, 'duration': duration, 'warmup': warmup,
+                     'frames': frames_dir or 'synthetic', 'frame_count': len(frames), 'resolution': resolution,
+                     'camera_fps': camera_fps, 'camera_latency_ms': camera_latency, 'camera_jitter_ms': camera_jitter,
+                     'camera_failure_rate': camera_failure_rate, 'poll_interval': poll_interval,
+                     'monitoring_interval': monitoring_interval, 'gallery': gallery, 'events': use_events,
+                     'schema': schema},
+        'requests': _summary(all_latencies, duration),
+        'errors': sum(errors.values()),
+        'endpoints': {endpoint: dict(_summary(values, duration), errors=errors.get(endpoint, 0))
+                      for endpoint, values in sorted(latencies.items())},
+        'endpoint_errors': errors,
+        'events_received': sum(client.events for client in clients),
+        'cameras_served': camera_totals,
+        'app': {'stages': app_metrics.get('stages'), 'counters': app_metrics.get('counters'),
+                'pipeline': app_metrics.get('pipeline'), 'monitoring': monitoring.get('monitoring')}
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Lasttest mit Fake-Kameras und simulierten Dashboards')
+    parser.add_argument('--cameras', type=int, default=20)
+    parser.add_argument('--dashboards', type=int, default=10)
+    parser.add_argument('--duration', type=float, default=30, help='Messdauer in Sekunden')
+    parser.add_argument('--warmup', type=float, default=5, help='Sekunden zwischen Monitoring-Start und Messung')
+    parser.add_argument('--frames', help='Ordner mit aufgenommenen JPEG-Frames (Standard: synthetisch)')
+    parser.add_argument('--fixtures', default=DEFAULT_FIXTURES, help='Gesichtsbilder für synthetische Frames und Galerie')
+    parser.add_argument('--resolution', default='1280x720')
+    parser.add_argument('--camera-fps', type=float, default=5)
+    parser.add_argument('--camera-latency', type=float, default=0, help='Antwortverzögerung der Kameras in ms')
+    parser.add_argument('--camera-jitter', type=float, default=0, help='Zusätzliche zufällige Verzögerung bis ms')
+    parser.add_argument('--camera-failure-rate', type=float, default=0.0,
+                        help='Anteil fehlschlagender Snapshots bzw. abgebrochener Stream-Frames (0-1)')
+    parser.add_argument('--poll-interval', type=float, default=1.0, help='Pause zwischen Polling-Runden pro Dashboard')
+    parser.add_argument('--monitoring-interval', type=int, default=5)
+    parser.add_argument('--gallery', type=int, default=100, help='Synthetische Identitäten in der Galerie')
+    parser.add_argument('--no-events', action='store_true', help='/api/events nicht offen halten')
+    parser.add_argument('--output', help='JSON zusätzlich in diese Datei schreiben')
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)  # intern: App-Prozess auf diesem Port
+    args = parser.parse_args()
+
+    if args.serve:
+        serve_app(args.serve, args.gallery, args.fixtures)
+        sys.exit(0)
+
+    report = run_load_test(args.cameras, args.dashboards, args.duration, args.warmup, args.frames, args.fixtures,
+                           args.resolution, args.camera_fps, args.camera_latency, args.camera_jitter,
+                           args.camera_failure_rate, args.poll_interval, args.monitoring_interval, args.gallery,
+                           not args.no_events)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    print(output)
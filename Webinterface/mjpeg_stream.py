@@ -0,0 +1,143 @@
+"""MJPEG-Streams der Kameras (mjpg-streamer, ?action=stream).
+
+MJPEGParser zerlegt multipart/x-mixed-replace inkrementell in JPEG-Frames,
+MJPEGStreamReader hält pro Kamera eine dauerhafte Verbindung und reicht jeden
+Frame an einen Callback weiter. Keine Nebenwirkungen beim Import.
+"""
+
+import threading
+import time
+from collections import deque
+
+import requests
+
+
+def get_camera_stream_url(ip_address):
+    return f"http://{ip_address}/?action=stream"
+
+
+class MJPEGParser:  # Zerlegt einen multipart/x-mixed-replace-Stream inkrementell in JPEG-Frames
+
+    max_buffer = 8 * 1024 * 1024
+
+    def __init__(self, boundary):
+        self.boundary = b'--' + boundary.strip().strip('"').lstrip('-').encode('latin-1')
+        self._buffer = bytearray()
+        self._content_length = None
+        self._in_body = False
+
+    def feed(self, data):  # Neue Bytes anhängen, vollständige Frames zurückgeben
+        self._buffer += data
+        frames = []
+
+        while True:
+            if not self._in_body:
+                start = self._buffer.find(self.boundary)
+                if start < 0:
+                    # Ende behalten, falls die Boundary über zwei Chunks verteilt ist
+                    del self._buffer[:max(0, len(self._buffer) - len(self.boundary))]
+                    break
+                header_end = self._buffer.find(b'\r\n\r\n', start)
+                if header_end < 0:
+                    del self._buffer[:start]
+                    break
+
+                headers = bytes(self._buffer[start + len(self.boundary):header_end]).decode('latin-1')
+                self._content_length = None
+                for line in headers.split('\r\n'):
+                    key, _, value = line.partition(':')
+                    if key.strip().lower() == 'content-length' and value.strip().isdigit():
+                        self._content_length = int(value.strip())
+                del self._buffer[:header_end + 4]
+                self._in_body = True
+
+            if self._content_length is not None:
+                if len(self._buffer) < self._content_length:
+                    break
+                frame = bytes(self._buffer[:self._content_length])
+                del self._buffer[:self._content_length]
+            else:
+                end = self._buffer.find(self.boundary)
+                if end < 0:
+                    break
+                frame = bytes(self._buffer[:end]).rstrip(b'\r\n')
+                del self._buffer[:end]
+
+            self._in_body = False
+            if frame:
+                frames.append(frame)
+
+        if len(self._buffer) > self.max_buffer:
+            self._buffer.clear()
+            self._in_body = False
+        return frames
+
+class MJPEGStreamReader:  # Hält eine dauerhafte Verbindung zu ?action=stream und puffert die letzten Frames
+
+    def __init__(self, ip_address, buffer_size=30, timeout=5, on_frame=None):
+        self.ip_address = ip_address
+        self.timeout = timeout
+        self.on_frame = on_frame
+        self.frames = deque(maxlen=buffer_size)  # (monotonic timestamp, JPEG-Bytes)
+        self.frame_count = 0
+        self.connected = False
+        self.last_error = None
+        self._response = None
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'mjpeg-{ip_address}', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        response = self._response
+        if response is not None:
+            response.close()  # blockierendes Lesen abbrechen
+
+    def latest(self):  # (timestamp, JPEG-Bytes) oder None
+        try:
+            return self.frames[-1]
+        except IndexError:
+            return None
+
+    def get_fps(self):
+        frames = list(self.frames)
+        if len(frames) < 2 or frames[-1][0] == frames[0][0]:
+            return 0.0
+        return round((len(frames) - 1) / (frames[-1][0] - frames[0][0]), 1)
+
+    def _run(self):
+        backoff = 1
+        while not self._stop_event.is_set():
+            try:
+                response = requests.get(get_camera_stream_url(self.ip_address), stream=True,
+                                        timeout=self.timeout, headers={'User-Agent': 'HomeShieldAI/1.0'})
+                self._response = response
+                with response:
+                    response.raise_for_status()
+                    content_type = response.headers.get('Content-Type', '')
+                    _, _, boundary = content_type.partition('boundary=')
+                    parser = MJPEGParser(boundary.split(';')[0] or 'boundarydonotcross')
+
+                    self.connected = True
+                    self.last_error = None
+                    backoff = 1
+                    for chunk in response.iter_content(chunk_size=4096):
+                        if self._stop_event.is_set():
+                            break
+                        for frame in parser.feed(chunk):
+                            self.frames.append((time.monotonic(), frame))
+                            self.frame_count += 1
+                            if self.on_frame:
+                                self.on_frame(self.ip_address, frame)
+            except Exception as e:
+                if not self._stop_event.is_set():
+                    self.last_error = str(e)
+            finally:
+                self.connected = False
+                self._response = None
+
+            self._stop_event.wait(backoff)
+            backoff = min(30, backoff * 2)
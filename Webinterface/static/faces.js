@@ -77,6 +77,16 @@ function resetForm() {
         preview.innerHTML = '';
     }
     
+    // Back to "new face" mode
+    const faceId = document.getElementById('faceId');
+    const faceName = document.getElementById('faceName');
+    if (faceId) {
+        faceId.value = '';
+    }
+    if (faceName) {
+        faceName.readOnly = false;
+    }
+    
     // Hide camera preview
     const cameraPreview = document.getElementById('cameraPreview');
     const captureBtn = document.getElementById('captureBtn');
@@ -277,6 +287,15 @@ function editFace(faceId, faceName) {
     }
 }
 
+function addFaceImage(faceId, faceName) {
+    // Same modal, but the image is added to an existing person
+    openAddFaceModal();
+    document.getElementById('faceId').value = faceId;
+    const nameInput = document.getElementById('faceName');
+    nameInput.value = faceName;
+    nameInput.readOnly = true;
+}
+
 function deleteFace(faceId, faceName) {
     if (confirm(`Möchten Sie das Gesicht "${faceName}" wirklich löschen?`)) {
         fetch(`/delete_face/${faceId}`, {
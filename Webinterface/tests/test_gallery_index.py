@@ -0,0 +1,57 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gallery_index import BruteForceIndex, IVFIndex, make_synthetic_gallery
+
+
+class EmptyCellsIVFIndex(IVFIndex):  # Zusätzliche Zentren ohne Encodings genau dort, wo die Anfragen liegen
+
+    def __init__(self, matrix, decoys, **options):
+        self.decoys = np.asarray(decoys, dtype=np.float32)
+        super().__init__(matrix, **options)
+
+    def _train(self, iterations, sample_size, rng):
+        self.n_lists -= len(self.decoys)
+        centroids = super()._train(iterations, sample_size, rng)
+        self.n_lists += len(self.decoys)
+        return np.vstack([centroids, self.decoys])
+
+
+class IVFIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.gallery, self.queries = make_synthetic_gallery(200, queries=20, seed=1)
+
+    def test_matches_brute_force_when_probing_everything(self):
+        ivf = IVFIndex(self.gallery, n_lists=8, n_probe=8)
+        exact_ids, exact_dist = BruteForceIndex(self.gallery).search(self.queries, 3)
+        ivf_ids, ivf_dist = ivf.search(self.queries, 3)
+        np.testing.assert_array_equal(ivf_ids, exact_ids)
+        np.testing.assert_allclose(ivf_dist, exact_dist, rtol=1e-4, atol=1e-4)
+
+    def test_search_skips_empty_cells(self):
+        # Weit entfernte Anfragen, deren nächste Zentren alle leer sind
+        far_queries = self.queries[:3] + 5.0
+        ivf = EmptyCellsIVFIndex(self.gallery, decoys=far_queries, n_lists=8, n_probe=3)
+        self.assertEqual(int(np.sum(np.diff(ivf._offsets) == 0)), 3)
+
+        ids, dist = ivf.search(far_queries, 3)
+        self.assertTrue((ids >= 0).all())
+        self.assertTrue(np.isfinite(dist).all())
+        exact_dist = np.linalg.norm(far_queries[:, None, :] - self.gallery[ids], axis=2)
+        np.testing.assert_allclose(dist, exact_dist, rtol=1e-4, atol=1e-4)
+
+    def test_n_probe_larger_than_filled_cells(self):
+        ivf = EmptyCellsIVFIndex(self.gallery, decoys=self.queries[:2] + 5.0, n_lists=4, n_probe=4)
+        ids, _ = ivf.search(self.queries, 3)
+        exact_ids, _ = BruteForceIndex(self.gallery).search(self.queries, 3)
+        np.testing.assert_array_equal(ids, exact_ids)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import os
+import sys
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mjpeg_stream import MJPEGParser, MJPEGStreamReader
+
+FRAMES = [b'\xff\xd8frame-%d\r\n--not-a-boundary\xff\xd9' % i + bytes(range(256)) * i for i in range(1, 6)]
+
+
+def make_stream(frames, boundary='boundarydonotcross', content_length=True):  # multipart-Body wie mjpg-streamer
+    body = b''
+    for frame in frames:
+        headers = 'Content-Type: image/jpeg\r\n'
+        if content_length:
+            headers += f'Content-Length: {len(frame)}\r\n'
+        body += f'--{boundary}\r\n{headers}\r\n'.encode('latin-1') + frame + b'\r\n'
+    return body + f'--{boundary}\r\n'.encode('latin-1')
+
+
+def feed_in_chunks(parser, data, chunk_size):
+    frames = []
+    for start in range(0, len(data), chunk_size):
+        frames += parser.feed(data[start:start + chunk_size])
+    return frames
+
+
+class MJPEGParserTest(unittest.TestCase):
+
+    def test_chunk_sizes_with_content_length(self):
+        data = make_stream(FRAMES)
+        for chunk_size in (1, 7, 4096, len(data)):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(feed_in_chunks(MJPEGParser('boundarydonotcross'), data, chunk_size), FRAMES)
+
+    def test_chunk_sizes_without_content_length(self):
+        # Ohne Content-Length endet ein Frame an der nächsten Boundary; Frames ohne Boundary-Text im Inhalt
+        frames = [b'\xff\xd8jpeg-%d\xff\xd9' % i * 50 for i in range(1, 6)]
+        data = make_stream(frames, content_length=False)
+        for chunk_size in (1, 7, 4096):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(feed_in_chunks(MJPEGParser('boundarydonotcross'), data, chunk_size), frames)
+
+    def test_boundary_from_header_variants(self):
+        data = make_stream(FRAMES[:2], boundary='myboundary')
+        for header_value in ('myboundary', '"myboundary"', '--myboundary'):
+            with self.subTest(boundary=header_value):
+                self.assertEqual(feed_in_chunks(MJPEGParser(header_value), data, 64), FRAMES[:2])
+
+    def test_garbage_before_first_boundary(self):
+        data = b'HTTP noise without boundary' * 10 + make_stream(FRAMES[:3])
+        self.assertEqual(feed_in_chunks(MJPEGParser('boundarydonotcross'), data, 13), FRAMES[:3])
+
+
+class FakeMJPEGServer:  # Liefert FRAMES einmal als Stream und hält die Verbindung dann offen
+
+    def __init__(self, content_length=True):
+        body = make_stream(FRAMES, content_length=content_length)
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path != '/?action=stream':
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=boundarydonotcross')
+                self.end_headers()
+                for start in range(0, len(body), 1000):  # in Stücken senden, wie eine echte Kamera
+                    self.wfile.write(body[start:start + 1000])
+                    self.wfile.flush()
+                    time.sleep(0.001)
+                time.sleep(1)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def address(self):
+        return f'127.0.0.1:{self.server.server_address[1]}'
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class MJPEGStreamReaderTest(unittest.TestCase):
+
+    def _read_frames(self, content_length):
+        server = FakeMJPEGServer(content_length)
+        received = []
+        done = threading.Event()
+
+        def on_frame(ip_address, frame):
+            received.append((ip_address, frame))
+            if len(received) >= len(FRAMES) - (0 if content_length else 1):
+                done.set()
+
+        reader = MJPEGStreamReader(server.address, buffer_size=3, on_frame=on_frame).start()
+        try:
+            self.assertTrue(done.wait(5), 'Reader hat nicht alle Frames geliefert')
+        finally:
+            reader.stop()
+            server.close()
+        return reader, received
+
+    def test_reader_delivers_frames_to_callback_and_ring_buffer(self):
+        reader, received = self._read_frames(content_length=True)
+        self.assertEqual([frame for _, frame in received], FRAMES)
+        self.assertEqual({ip for ip, _ in received}, {reader.ip_address})
+        self.assertEqual(reader.frame_count, len(FRAMES))
+        self.assertEqual([frame for _, frame in reader.frames], FRAMES[-3:])
+        self.assertEqual(reader.latest()[1], FRAMES[-1])
+
+    def test_reader_without_content_length(self):
+        # Der letzte Frame ist erst mit der nächsten Boundary vollständig
+        _, received = self._read_frames(content_length=False)
+        self.assertEqual([frame for _, frame in received], FRAMES[:len(received)])
+
+
+if __name__ == '__main__':
+    unittest.main()